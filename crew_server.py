@@ -9,6 +9,8 @@ FastAPI backend exposing the 3-tier CrewAI diagnostic system on port 9000.
 
 Endpoints:
 - POST /diagnose - Run CrewAI diagnostic analysis
+- POST /diagnose_batch - Run several diagnostic analyses concurrently
+- GET /diagnose_stream - Stream diagnostic sections as Server-Sent Events
 - GET /health - Health check
 """
 
@@ -16,21 +18,149 @@ import os
 import json
 import time
 import re
-from typing import Any, Dict, List, Optional
-from fastapi import FastAPI, HTTPException
+import asyncio
+import hashlib
+import heapq
+import logging
+import logging.handlers
+import math
+import queue
+import atexit
+import dataclasses
+from functools import lru_cache
+from itertools import islice
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from enum import StrEnum
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from fastapi import Depends, FastAPI, HTTPException, Request
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
-import requests
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter, ValidationError
+from pydantic.dataclasses import dataclass
+import httpx
+import orjson
 
 # ======================================================================
 # CONFIGURATION
 # ======================================================================
 
-RAG_API_URL = os.environ.get("RAG_API_URL", "http://127.0.0.1:8000")
+@dataclasses.dataclass(frozen=True, slots=True)
+class Settings:
+    """Environment configuration, read once per process."""
+    rag_api_url: str
+    # Browsers only reach this server through the web app; Node calls it server-side
+    cors_allow_origins: tuple
+    # Upper bound on RAG queries in flight at once, shared by every request
+    rag_max_concurrency: int
+    # Successful RAG lookups are shared across requests for ttl seconds
+    rag_cache_size: int
+    rag_cache_ttl: float
+    # Completed diagnoses are reused for identical requests (size 0 disables)
+    response_cache_size: int
+    response_cache_ttl: float
+    # Near-duplicate queries for the same aircraft context reuse a cached
+    # diagnosis when their trigram cosine similarity exceeds the threshold.
+    # Off by default (size 0): trigrams are lexical, not a sentence embedding
+    semantic_cache_size: int
+    semantic_cache_threshold: float
+    # Items of one /diagnose_batch call that run at the same time
+    batch_max_concurrency: int
+    # Worker threads for the synchronous CrewAI pipeline (bounds concurrent LLM runs)
+    crewai_max_workers: int
+    port: int
+    # Each worker process keeps its own caches, RAG client and CrewAI threads
+    workers: int
+    # Per-request RAG/scoring trace at DEBUG log level (CREWAI_DEBUG=1)
+    debug: bool
+    # Minimum level otherwise; WARNING drops the per-request progress lines
+    log_level: str
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Build the process-wide Settings from the environment."""
+    env = os.environ
+    return Settings(
+        rag_api_url=env.get("RAG_API_URL", "http://127.0.0.1:8000"),
+        cors_allow_origins=tuple(
+            origin.strip()
+            for origin in env.get("CORS_ALLOW_ORIGINS", "http://localhost:5000,http://127.0.0.1:5000").split(",")
+            if origin.strip()
+        ),
+        rag_max_concurrency=int(env.get("RAG_MAX_CONCURRENCY", "4")),
+        rag_cache_size=int(env.get("RAG_CACHE_SIZE", "512")),
+        rag_cache_ttl=float(env.get("RAG_CACHE_TTL", "300")),
+        response_cache_size=int(env.get("RESPONSE_CACHE_SIZE", "256")),
+        response_cache_ttl=float(env.get("RESPONSE_CACHE_TTL", "600")),
+        semantic_cache_size=int(env.get("SEMANTIC_CACHE_SIZE", "0")),
+        semantic_cache_threshold=float(env.get("SEMANTIC_CACHE_THRESHOLD", "0.92")),
+        batch_max_concurrency=int(env.get("BATCH_MAX_CONCURRENCY", "8")),
+        crewai_max_workers=int(env.get("CREWAI_MAX_WORKERS", "8")),
+        port=int(env.get("CREW_API_PORT", "9000")),
+        workers=int(env.get("CREW_API_WORKERS", "1")),
+        debug=env.get("CREWAI_DEBUG") == "1",
+        log_level=env.get("CREWAI_LOG_LEVEL", "INFO").upper()
+    )
+
+settings = get_settings()
+
+RAG_API_URL = settings.rag_api_url
 RAG_QUERY_ENDPOINT = f"{RAG_API_URL}/query"
 RAG_HEALTH_ENDPOINT = f"{RAG_API_URL}/health"
 CERTAINTY_THRESHOLD = 95
 
+# ata_code values that select a training manual instead of an ATA chapter
+TRAINING_MATERIAL_CONTEXT = {
+    "PRIMUS_EPIC": "Primus Epic avionics system",
+    "PT6C_67CD": "PT6C-67CD engine",
+    "AW139_AIRFRAME": "AW139 Airframe systems"
+}
+TRAINING_MATERIALS = frozenset(TRAINING_MATERIAL_CONTEXT)
+
+# Shared RAG HTTP client settings (per-call timeouts override the default).
+# Idle sockets are kept for 30s so consecutive diagnoses reuse the same
+# connection; connect failures are retried by the transport, HTTP errors
+# by the retry loop in query_rag.
+RAG_HTTP_TIMEOUT = httpx.Timeout(30.0)
+RAG_HTTP_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=50, keepalive_expiry=30.0)
+RAG_HTTP_CONNECT_RETRIES = 3
+# Upper bound on a server-supplied Retry-After honored by query_rag (seconds)
+RAG_MAX_RETRY_AFTER = 30.0
+# /health reports the last RAG probe for this long instead of probing per call
+RAG_HEALTH_CACHE_TTL = 15
+
+RAG_MAX_CONCURRENCY = settings.rag_max_concurrency
+RAG_CACHE_SIZE = settings.rag_cache_size
+RAG_CACHE_TTL = settings.rag_cache_ttl
+RESPONSE_CACHE_SIZE = settings.response_cache_size
+RESPONSE_CACHE_TTL = settings.response_cache_ttl
+SEMANTIC_CACHE_SIZE = settings.semantic_cache_size
+SEMANTIC_CACHE_THRESHOLD = settings.semantic_cache_threshold
+BATCH_MAX_CONCURRENCY = settings.batch_max_concurrency
+CREWAI_MAX_WORKERS = settings.crewai_max_workers
+
+# ======================================================================
+# LOGGING
+# ======================================================================
+
+logger = logging.getLogger("crew_server")
+# DEBUG adds the per-request RAG/scoring trace
+logger.setLevel(logging.DEBUG if settings.debug else settings.log_level)
+logger.propagate = False
+
+# Callers only enqueue records; a background thread writes them to stderr
+_log_queue: queue.Queue = queue.Queue(-1)
+logger.addHandler(logging.handlers.QueueHandler(_log_queue))
+_log_handler = logging.StreamHandler()
+_log_handler.setFormatter(logging.Formatter(
+    "%(asctime)s | %(levelname)-8s | %(message)s", datefmt="%Y-%m-%d %H:%M:%S"
+))
+log_listener = logging.handlers.QueueListener(_log_queue, _log_handler)
+log_listener.start()
+atexit.register(log_listener.stop)
+
 # ======================================================================
 # FASTAPI APP
 # ======================================================================
@@ -43,42 +173,90 @@ app = FastAPI(
 
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
+    allow_origins=list(settings.cors_allow_origins),
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
 )
 
+class DiagnosisGZipMiddleware(GZipMiddleware):
+    """GZip for JSON replies; the SSE stream is passed through untouched.
+    
+    Older Starlette releases compress streaming bodies without flushing,
+    which would hold SSE events back until the stream closes.
+    """
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] == "/diagnose_stream":
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+app.add_middleware(DiagnosisGZipMiddleware, minimum_size=1024, compresslevel=5)
+
 # ======================================================================
 # REQUEST/RESPONSE MODELS
 # ======================================================================
 
+class TaskType(StrEnum):
+    FAULT_ISOLATION = "fault_isolation"
+    FUNCTIONAL_TEST = "functional_test"
+    OPERATIONAL_TEST = "operational_test"
+    REMOVE_PROCEDURE = "remove_procedure"
+    INSTALL_PROCEDURE = "install_procedure"
+    SYSTEM_DESCRIPTION = "system_description"
+    DETAILED_INSPECTION = "detailed_inspection"
+    DISASSEMBLY = "disassembly"
+    ASSEMBLY = "assembly"
+    ADJUSTMENT = "adjustment"
+    BONDING_CHECK = "bonding_check"
+    OTHER = "other"
+
+    @classmethod
+    def _missing_(cls, value):
+        # An empty task type has always meant fault isolation
+        return cls.FAULT_ISOLATION if value in ("", None) else None
+
+class AircraftConfiguration(StrEnum):
+    UNKNOWN = ""
+    SHORT_NOSE = "SN"
+    LONG_NOSE = "LN"
+    ENHANCED = "ENH"
+    PLUS = "PLUS"
+
 class DiagnoseRequest(BaseModel):
     query: str = Field(..., description="Maintenance diagnostic query")
     serial_number: str = Field(default="31486", description="Aircraft serial number")
     ata_code: str = Field(default="", description="ATA code or training material (PRIMUS_EPIC, PT6C_67CD, AW139_AIRFRAME)")
-    task_type: str = Field(default="fault_isolation", description="Task type: fault_isolation, functional_test, operational_test, remove_procedure, install_procedure, system_description, detailed_inspection, disassembly, assembly, adjustment, bonding_check, other")
-    aircraft_configuration: str = Field(default="", description="Aircraft configuration code: SN, LN, ENH, PLUS")
+    task_type: TaskType = Field(default=TaskType.FAULT_ISOLATION, description="Maintenance task type")
+    aircraft_configuration: AircraftConfiguration = Field(default=AircraftConfiguration.UNKNOWN, description="Aircraft configuration code: SN, LN, ENH, PLUS")
     configuration_name: str = Field(default="", description="Aircraft configuration name: Short Nose, Long Nose, Enhanced, PLUS")
 
-class AffectedPart(BaseModel):
+# Row types of DiagnoseResponse: slotted, immutable and still validated by pydantic
+
+@dataclass(slots=True, frozen=True)
+class AffectedPart:
     part_number: str
     description: str
     location: str
     action: str
 
-class LikelyCause(BaseModel):
+@dataclass(slots=True, frozen=True)
+class LikelyCause:
     cause: str
     probability: int
     reasoning: str
 
-class RecommendedTest(BaseModel):
+@dataclass(slots=True, frozen=True)
+class RecommendedTest:
     step: int
     description: str
     reference: str
     expected_result: str
 
 class DiagnoseResponse(BaseModel):
+    model_config = ConfigDict(extra="forbid", frozen=True)
+    
     query: str
     serial_number: str
     diagnosis: str
@@ -93,6 +271,30 @@ class DiagnoseResponse(BaseModel):
     source: str = "CrewAI 3-Tier System + RAG"
     processing_time_ms: float = 0.0
 
+class BatchDiagnoseRequest(BaseModel):
+    items: List[DiagnoseRequest] = Field(..., description="Diagnostic requests to run together")
+
+class BatchItemError(BaseModel):
+    index: int
+    status_code: int
+    detail: str
+
+# Batch bodies are validated straight from the raw JSON bytes in pydantic-core
+_BATCH_ADAPTER = TypeAdapter(BatchDiagnoseRequest)
+
+class BatchDiagnoseResponse(BaseModel):
+    results: List[Optional[DiagnoseResponse]]
+    errors: List[BatchItemError] = []
+    processing_time_ms: float = 0.0
+
+# Responses are already validated models; dump them straight to JSON bytes
+# instead of letting FastAPI re-validate and re-encode them
+_RESP_ADAPTER = TypeAdapter(DiagnoseResponse)
+_BATCH_RESP_ADAPTER = TypeAdapter(BatchDiagnoseResponse)
+
+# Receives (section, data) as each stage of a diagnosis completes
+DiagnosisEmitter = Callable[[str, Any], Awaitable[None]]
+
 class HealthResponse(BaseModel):
     status: str
     rag_connected: bool
@@ -110,101 +312,266 @@ try:
     from maintenance_crew import AW139DiagnosticCrew as _AW139DiagnosticCrew
     AW139DiagnosticCrew = _AW139DiagnosticCrew
     CREWAI_AVAILABLE = True
-    print("[CrewAI] Maintenance crew module loaded successfully")
+    logger.info("[CrewAI] Maintenance crew module loaded successfully")
 except ImportError as e:
-    print(f"[CrewAI] WARNING: Could not import maintenance_crew: {e}")
-    print("[CrewAI] Falling back to direct RAG mode")
+    logger.warning("[CrewAI] Could not import maintenance_crew: %s", e)
+    logger.warning("[CrewAI] Falling back to direct RAG mode")
 
 # ======================================================================
-# HELPER FUNCTIONS
+# RAG HTTP CLIENT
 # ======================================================================
 
-def clean_markdown_artifacts(text: str) -> str:
-    """Remove ALL markdown formatting, quotes, and format with proper line breaks."""
-    if not text:
-        return text
-    
-    cleaned = text
+rag_client: Optional[httpx.AsyncClient] = None
+
+def get_rag_client() -> httpx.AsyncClient:
+    """Return the shared async RAG client, creating it if startup has not run."""
+    global rag_client
+    if rag_client is None:
+        transport = httpx.AsyncHTTPTransport(limits=RAG_HTTP_LIMITS, retries=RAG_HTTP_CONNECT_RETRIES)
+        rag_client = httpx.AsyncClient(timeout=RAG_HTTP_TIMEOUT, transport=transport)
+    return rag_client
+
+rag_semaphore: Optional[asyncio.Semaphore] = None
+
+def get_rag_semaphore() -> asyncio.Semaphore:
+    """Return the shared semaphore that bounds concurrent RAG queries."""
+    global rag_semaphore
+    if rag_semaphore is None:
+        rag_semaphore = asyncio.Semaphore(RAG_MAX_CONCURRENCY)
+    return rag_semaphore
+
+# ======================================================================
+# CREWAI WORKER POOL
+# ======================================================================
+
+crew_executor: Optional[ThreadPoolExecutor] = None
+
+def get_crew_executor() -> ThreadPoolExecutor:
+    """Return the thread pool that runs CrewAI diagnostics off the event loop.
     
+    Created on first use rather than at startup: no endpoint routes to
+    run_crewai_diagnosis today.
+    """
+    global crew_executor
+    if crew_executor is None:
+        crew_executor = ThreadPoolExecutor(max_workers=CREWAI_MAX_WORKERS, thread_name_prefix="crewai")
+    return crew_executor
+
+# ======================================================================
+# RESPONSE CACHE
+# ======================================================================
+
+class TTLCache:
+    """Small LRU cache whose entries expire after ttl seconds."""
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: "OrderedDict[Any, tuple]" = OrderedDict()
+
+    def get(self, key: Any) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Any, value: Any) -> None:
+        if self.max_size <= 0:
+            return
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+response_cache = TTLCache(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL)
+rag_result_cache = TTLCache(RAG_CACHE_SIZE, RAG_CACHE_TTL)
+rag_health_cache = TTLCache(1, RAG_HEALTH_CACHE_TTL)
+
+def response_cache_key(request: DiagnoseRequest) -> str:
+    """Stable key over every request field."""
+    payload = orjson.dumps(request.model_dump(), option=orjson.OPT_SORT_KEYS)
+    return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+def embed_query(text: str) -> Dict[str, float]:
+    """Unit-length character trigram profile of a query."""
+    text = f" {' '.join(text.lower().split())} "
+    counts: Dict[str, float] = {}
+    for i in range(len(text) - 2):
+        gram = text[i:i + 3]
+        counts[gram] = counts.get(gram, 0.0) + 1.0
+    norm = math.sqrt(sum(v * v for v in counts.values()))
+    return {gram: v / norm for gram, v in counts.items()} if norm else counts
+
+def cosine_similarity(a: Dict[str, float], b: Dict[str, float]) -> float:
+    """Dot product of two unit-length sparse vectors."""
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(v * b.get(gram, 0.0) for gram, v in a.items())
+
+class SemanticCache:
+    """Reuses responses for near-duplicate queries with the same aircraft context."""
+
+    def __init__(self, max_size: int, threshold: float, ttl: float):
+        self.threshold = threshold
+        self.ttl = ttl
+        self._entries: deque = deque(maxlen=max(max_size, 0))
+
+    def get(self, context: tuple, embedding: Dict[str, float]) -> Any:
+        now = time.monotonic()
+        best_score, best = self.threshold, None
+        for expires_at, entry_context, entry_embedding, value in self._entries:
+            if entry_context != context or expires_at < now:
+                continue
+            score = cosine_similarity(embedding, entry_embedding)
+            if score >= best_score:
+                best_score, best = score, value
+        return best
+
+    def set(self, context: tuple, embedding: Dict[str, float], value: Any) -> None:
+        self._entries.append((time.monotonic() + self.ttl, context, embedding, value))
+
+semantic_cache = SemanticCache(SEMANTIC_CACHE_SIZE, SEMANTIC_CACHE_THRESHOLD, RESPONSE_CACHE_TTL)
+
+# Numbers and sides pick out which engine, hydraulic system or gear leg a
+# query is about; "No. 1" and "No. 2" look alike to trigrams, so they must
+# match exactly
+_QUERY_DISCRIMINATOR_RE = re.compile(r'\d+|\b(?:lh|rh|l/h|r/h|left|right)\b')
+
+def semantic_cache_context(request: DiagnoseRequest) -> tuple:
+    """Request fields, and query numbers/sides, that must match exactly for a semantic cache hit."""
+    return (
+        request.serial_number, request.ata_code, request.task_type,
+        request.aircraft_configuration, request.configuration_name,
+        tuple(_QUERY_DISCRIMINATOR_RE.findall(request.query.lower()))
+    )
+
+# ======================================================================
+# HELPER FUNCTIONS
+# ======================================================================
+
+# clean_markdown_artifacts rewrite steps, applied in order as
+# (trigger, pattern, replacement); a step is skipped when its trigger
+# substring is absent, since the pattern cannot match without it
+_MD_CLEAN_STEPS = (
     # Remove === headers (e.g., "=== PROCEDURE: ... ===")
-    cleaned = re.sub(r'={2,}\s*', '', cleaned)
+    ('==', re.compile(r'={2,}\s*'), ''),
     
     # Remove markdown headers at start of line (##, ###, etc.)
-    cleaned = re.sub(r'^\s*#{1,6}\s*', '', cleaned, flags=re.MULTILINE)
-    cleaned = re.sub(r'([.!?-])\s*#{1,6}\s+', r'\1 ', cleaned)
+    ('#', re.compile(r'^\s*#{1,6}\s*', re.MULTILINE), ''),
+    ('#', re.compile(r'([.!?-])\s*#{1,6}\s+'), r'\1 '),
     
     # Remove bold/italic markdown
-    cleaned = re.sub(r'\*\*\*(.+?)\*\*\*', r'\1', cleaned, flags=re.DOTALL)
-    cleaned = re.sub(r'\*\*(.+?)\*\*', r'\1', cleaned, flags=re.DOTALL)
-    cleaned = re.sub(r'__(.+?)__', r'\1', cleaned, flags=re.DOTALL)
-    cleaned = re.sub(r'(?<!\w)\*([^*\n]+)\*(?!\w)', r'\1', cleaned)
-    cleaned = re.sub(r'(?<!\w)_([^_\n]+)_(?!\w)', r'\1', cleaned)
-    cleaned = re.sub(r'\*{2,}', '', cleaned)
+    ('***', re.compile(r'\*\*\*(.+?)\*\*\*', re.DOTALL), r'\1'),
+    ('**', re.compile(r'\*\*(.+?)\*\*', re.DOTALL), r'\1'),
+    ('__', re.compile(r'__(.+?)__', re.DOTALL), r'\1'),
+    ('*', re.compile(r'(?<!\w)\*([^*\n]+)\*(?!\w)'), r'\1'),
+    ('_', re.compile(r'(?<!\w)_([^_\n]+)_(?!\w)'), r'\1'),
+    ('**', re.compile(r'\*{2,}'), ''),
     
     # Remove horizontal rules
-    cleaned = re.sub(r'^\s*[-]{2,}\s*$', '', cleaned, flags=re.MULTILINE)
-    cleaned = re.sub(r'^\s*[_]{3,}\s*$', '', cleaned, flags=re.MULTILINE)
+    ('--', re.compile(r'^\s*[-]{2,}\s*$', re.MULTILINE), ''),
+    ('___', re.compile(r'^\s*[_]{3,}\s*$', re.MULTILINE), ''),
     
     # Remove code backticks
-    cleaned = re.sub(r'`([^`]+)`', r'\1', cleaned)
-    cleaned = re.sub(r'```[^`]*```', '', cleaned, flags=re.DOTALL)
+    ('`', re.compile(r'`([^`]+)`'), r'\1'),
+    ('```', re.compile(r'```[^`]*```', re.DOTALL), ''),
     
     # Remove markdown links and images
-    cleaned = re.sub(r'\[([^\]]+)\]\([^\)]+\)', r'\1', cleaned)
-    cleaned = re.sub(r'!\[[^\]]*\]\([^\)]+\)', '', cleaned)
+    ('](', re.compile(r'\[([^\]]+)\]\([^\)]+\)'), r'\1'),
+    ('![', re.compile(r'!\[[^\]]*\]\([^\)]+\)'), ''),
     
     # Remove excessive quotes around procedure steps (keep the text, remove quotes)
-    cleaned = re.sub(r'"([^"]{10,})"', r'\1', cleaned)
+    ('"', re.compile(r'"([^"]{10,})"'), r'\1'),
     
     # Remove markdown bullets at start of line
-    cleaned = re.sub(r'^\s*[-*+]\s+', '  ', cleaned, flags=re.MULTILINE)
+    (None, re.compile(r'^\s*[-*+]\s+', re.MULTILINE), '  '),
     
     # Format numbered steps - ensure each starts on new line
     # First normalize: collapse multiple newlines/spaces around numbered items
-    cleaned = re.sub(r'\n+\s*(\d+)\.\s+', r'\n\n\1. ', cleaned)
-    cleaned = re.sub(r'\n+\s*(\d+)\.(\d+)\.\s+', r'\n   \1.\2. ', cleaned)
-    cleaned = re.sub(r'\n+\s*(\d+)\.(\d+)\.(\d+)\.\s+', r'\n      \1.\2.\3. ', cleaned)
+    ('.', re.compile(r'\n+\s*(\d+)\.\s+'), r'\n\n\1. '),
+    ('.', re.compile(r'\n+\s*(\d+)\.(\d+)\.\s+'), r'\n   \1.\2. '),
+    ('.', re.compile(r'\n+\s*(\d+)\.(\d+)\.(\d+)\.\s+'), r'\n      \1.\2.\3. '),
     
     # Ensure main steps (single digit followed by period and text) start on new line
-    cleaned = re.sub(r'([^\n])\s+(\d)\.(?!\d)\s+([A-Z])', r'\1\n\n\2. \3', cleaned)
+    ('.', re.compile(r'([^\n])\s+(\d)\.(?!\d)\s+([A-Z])'), r'\1\n\n\2. \3'),
     # Ensure sub-steps like 2.1. also start on new line with indent
-    cleaned = re.sub(r'([^\n])\s+(\d+\.\d+)\.\s+([A-Z])', r'\1\n   \2. \3', cleaned)
+    ('.', re.compile(r'([^\n])\s+(\d+\.\d+)\.\s+([A-Z])'), r'\1\n   \2. \3'),
     
     # Format section headers on their own lines
-    cleaned = re.sub(r'(?<!\n)(PROCEDURE|PREREQUISITES|SUPPORT EQUIPMENT|DMC Reference|REQUIREMENTS AFTER|SENIOR TECHNICIAN NOTE):', r'\n\n\1:', cleaned)
+    (':', re.compile(r'(?<!\n)(PROCEDURE|PREREQUISITES|SUPPORT EQUIPMENT|DMC Reference|REQUIREMENTS AFTER|SENIOR TECHNICIAN NOTE):'), r'\n\n\1:'),
     
     # Clean TPD_PSE references - make them more readable
-    cleaned = re.sub(r'TPD_PSE;(\d+);;;?', r'(PSE Ref: \1)', cleaned)
-    cleaned = re.sub(r'\(PSE Ref: \d+\)\s*\(PSE Ref: \d+\)', lambda m: m.group(0).replace(') (', ', '), cleaned)
+    ('TPD_PSE;', re.compile(r'TPD_PSE;(\d+);;;?'), r'(PSE Ref: \1)'),
+    ('PSE Ref: ', re.compile(r'\(PSE Ref: \d+\)\s*\(PSE Ref: \d+\)'), lambda m: m.group(0).replace(') (', ', ')),
     
     # Clean up excessive whitespace
-    cleaned = re.sub(r'\n{3,}', '\n\n', cleaned)
-    cleaned = re.sub(r'^\s+$', '', cleaned, flags=re.MULTILINE)
-    cleaned = re.sub(r' {2,}', ' ', cleaned)
-    cleaned = re.sub(r'^\n+', '', cleaned)
+    ('\n\n\n', re.compile(r'\n{3,}'), '\n\n'),
+    (None, re.compile(r'^\s+$', re.MULTILINE), ''),
+    ('  ', re.compile(r' {2,}'), ' '),
+    (None, re.compile(r'^\n+'), ''),
+)
+
+def clean_markdown_artifacts(text: str) -> str:
+    """Remove ALL markdown formatting, quotes, and format with proper line breaks."""
+    if not text:
+        return text
+    
+    cleaned = text
+    for trigger, pattern, replacement in _MD_CLEAN_STEPS:
+        if trigger is None or trigger in cleaned:
+            cleaned = pattern.sub(replacement, cleaned)
     
     return cleaned.strip()
 
+# Part numbers cut off by an unclosed parenthesis at end of line
+_PART_TRUNC_RES = (
+    re.compile(r'([A-Z0-9-]{5,})\s*\([A-Z]{1,2}$', re.MULTILINE),
+    re.compile(r'([A-Z0-9-]{5,})\s*\($', re.MULTILINE),
+)
+
 def validate_part_numbers(text: str) -> str:
     """Fix only clearly truncated part numbers, preserving legitimate parenthetical info."""
-    if not text:
+    # Both truncation patterns end in an open parenthesis
+    if not text or "(" not in text:
         return text
     
-    text = re.sub(r'([A-Z0-9-]{5,})\s*\([A-Z]{1,2}$', r'\1', text, flags=re.MULTILINE)
-    text = re.sub(r'([A-Z0-9-]{5,})\s*\($', r'\1', text, flags=re.MULTILINE)
+    for pattern in _PART_TRUNC_RES:
+        text = pattern.sub(r'\1', text)
     
     return text
 
-def check_rag_health() -> bool:
+async def check_rag_health() -> bool:
     """Check if RAG API is available."""
+    healthy = rag_health_cache.get("rag")
+    if healthy is not None:
+        return healthy
     try:
-        response = requests.get(RAG_HEALTH_ENDPOINT, timeout=5)
-        data = response.json()
-        return data.get("status") == "healthy" and data.get("index_loaded", False)
+        response = await get_rag_client().get(RAG_HEALTH_ENDPOINT, timeout=5)
+        data = orjson.loads(response.content)
+        healthy = data.get("status") == "healthy" and data.get("index_loaded", False)
     except Exception:
-        return False
+        healthy = False
+    rag_health_cache.set("rag", healthy)
+    return healthy
+
+def _is_non_retriable_status(status: int) -> bool:
+    """4xx responses other than 429 are deterministic; retrying cannot help."""
+    return 400 <= status < 500 and status != 429
 
-def query_rag(query: str, top_k: int = 10, max_retries: int = 3, ata_code: str = "") -> Dict[str, Any]:
+def _retry_delay(response: httpx.Response, default: float) -> float:
+    """Seconds to wait before retrying: the server's Retry-After when given, else the default backoff."""
+    retry_after = response.headers.get("retry-after", "")
+    try:
+        return min(max(float(retry_after), 0.0), RAG_MAX_RETRY_AFTER)
+    except ValueError:
+        return default
+
+async def query_rag(query: str, top_k: int = 10, max_retries: int = 3, ata_code: str = "") -> Dict[str, Any]:
     """Query the RAG API with retry logic and ATA/training filter.
     
     CRITICAL: When ata_code is a training material (PRIMUS_EPIC, PT6C_67CD, AW139_AIRFRAME),
@@ -214,30 +581,25 @@ def query_rag(query: str, top_k: int = 10, max_retries: int = 3, ata_code: str =
     last_error = None
     
     # Check if this is a training material filter
-    training_materials = ["PRIMUS_EPIC", "PT6C_67CD", "AW139_AIRFRAME"]
-    is_training_material = ata_code in training_materials
+    is_training_material = ata_code in TRAINING_MATERIALS
     
     # Build enhanced query with context hints
     enhanced_query = query
     if ata_code:
-        training_context = {
-            "PRIMUS_EPIC": "Primus Epic avionics system",
-            "PT6C_67CD": "PT6C-67CD engine",
-            "AW139_AIRFRAME": "AW139 Airframe systems"
-        }
         if is_training_material:
-            enhanced_query = f"{training_context[ata_code]}: {query}"
-            print(f"[CrewAI] TRAINING MATERIAL EXCLUSIVE FILTER: {ata_code}")
+            enhanced_query = f"{TRAINING_MATERIAL_CONTEXT[ata_code]}: {query}"
+            logger.debug("[CrewAI] TRAINING MATERIAL EXCLUSIVE FILTER: %s", ata_code)
         else:
             enhanced_query = f"ATA {ata_code}: {query}"
-            print(f"[CrewAI] ATA code filter: {ata_code}")
+            logger.debug("[CrewAI] ATA code filter: %s", ata_code)
     
+    client = get_rag_client()
     for attempt in range(max_retries):
         try:
-            print(f"[CrewAI] RAG query attempt {attempt + 1}/{max_retries}: {enhanced_query[:60]}...")
+            logger.debug("[CrewAI] RAG query attempt %d/%d: %.60s...", attempt + 1, max_retries, enhanced_query)
             
             # Pass ata_filter to RAG for document filtering
-            response = requests.post(
+            response = await client.post(
                 RAG_QUERY_ENDPOINT,
                 json={
                     "query": enhanced_query, 
@@ -248,57 +610,140 @@ def query_rag(query: str, top_k: int = 10, max_retries: int = 3, ata_code: str =
                 timeout=90
             )
             response.raise_for_status()
-            data = response.json()
+            # orjson parses the multi-KB document payload several times faster than json
+            data = orjson.loads(response.content)
             
             docs = data.get("documents") or data.get("chunks") or []
-            print(f"[CrewAI] RAG returned {len(docs)} documents (filter: {ata_code or 'none'})")
+            logger.debug("[CrewAI] RAG returned %d documents (filter: %s)", len(docs), ata_code or 'none')
             
             return data
+        except httpx.HTTPStatusError as e:
+            last_error = e
+            status = e.response.status_code
+            logger.warning("[CrewAI] RAG error on attempt %d: %s", attempt + 1, e)
+            # A rejected request (bad filter, malformed query) fails the same way every time
+            if _is_non_retriable_status(status):
+                return {"error": f"RAG query failed: {e}", "status": status}
+            if attempt < max_retries - 1:
+                await asyncio.sleep(_retry_delay(e.response, backoff_times[attempt]))
         except Exception as e:
             last_error = e
-            print(f"[CrewAI] RAG error on attempt {attempt + 1}: {e}")
+            logger.warning("[CrewAI] RAG error on attempt %d: %s", attempt + 1, e)
             if attempt < max_retries - 1:
-                time.sleep(backoff_times[attempt])
+                await asyncio.sleep(backoff_times[attempt])
     
     return {"error": f"RAG query failed: {last_error}"}
 
-def extract_part_numbers(text: str) -> List[Dict[str, str]]:
-    """Extract real part numbers from text."""
-    parts = []
-    seen = set()
-    
-    patterns = [
-        (r'\b(3G\d{4}[A-Z0-9-]+)\b', "AW139 Component"),
-        (r'\b(\d{3}-\d{4}-\d{2}-\d{2})\b', "Assembly Part"),
-        (r'\b(109-\d{4}-\d{2}-\d{2})\b', "Honeywell Component"),
-        (r'P/N[:\s]*([A-Z0-9-]{6,})', "Identified Part"),
-        (r'\b([A-Z]{2,3}\d{5,}[A-Z0-9-]*)\b', "Aircraft Part"),
-    ]
-    
-    for pattern, desc_prefix in patterns:
-        for match in re.finditer(pattern, text, re.IGNORECASE):
+# RAG lookups currently on the wire, keyed like rag_result_cache
+rag_inflight: Dict[tuple, asyncio.Future] = {}
+
+async def _fetch_rag(key: tuple) -> Dict[str, Any]:
+    """query_rag bounded by the shared RAG concurrency limit; caches successes."""
+    query, top_k, ata_code = key
+    try:
+        async with get_rag_semaphore():
+            result = await query_rag(query, top_k=top_k, ata_code=ata_code)
+        if "error" not in result:
+            rag_result_cache.set(key, result)
+        return result
+    finally:
+        rag_inflight.pop(key, None)
+
+async def _rag_query(query: str, top_k: int = 10, ata_code: str = "") -> Dict[str, Any]:
+    """RAG lookup shared across requests: cached, with identical lookups in flight coalesced."""
+    key = (query, top_k, ata_code)
+    result = rag_result_cache.get(key)
+    if result is not None:
+        return result
+    pending = rag_inflight.get(key)
+    if pending is None:
+        pending = rag_inflight[key] = asyncio.ensure_future(_fetch_rag(key))
+    # One caller going away (e.g. a closed stream) must not cancel the others
+    return await asyncio.shield(pending)
+
+def _copy_rag_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Copy a RAG result deep enough that callers can append to its document lists."""
+    return {key: list(value) if isinstance(value, list) else value for key, value in result.items()}
+
+async def _copied_rag_query(query: str, top_k: int = 10, ata_code: str = "") -> Dict[str, Any]:
+    """_rag_query returning a copy, so callers never modify the shared cache entry."""
+    return _copy_rag_result(await _rag_query(query, top_k=top_k, ata_code=ata_code))
+
+class RequestCache:
+    """Memoizes RAG lookups for the lifetime of one diagnostic request."""
+
+    def __init__(self):
+        self._tasks: Dict[tuple, asyncio.Task] = {}
+
+    async def query(self, query: str, top_k: int = 10, ata_code: str = "") -> Dict[str, Any]:
+        key = (query, top_k, ata_code)
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(_rag_query(query, top_k=top_k, ata_code=ata_code))
+            self._tasks[key] = task
+        else:
+            logger.info("[CrewAI] RAG lookup served from request cache: %.60s...", query)
+        return _copy_rag_result(await task)
+
+async def query_rag_many(lookups: List[Dict[str, Any]], rag_cache: Optional[RequestCache] = None) -> List[Any]:
+    """Run several RAG lookups concurrently; a failed lookup is returned as its exception.
+    
+    Each lookup holds query/top_k/ata_code keyword arguments. Lookups share the
+    RAG concurrency limit and, when given, the request's rag_cache.
+    """
+    run = rag_cache.query if rag_cache is not None else _copied_rag_query
+    return await asyncio.gather(*(run(**lookup) for lookup in lookups), return_exceptions=True)
+
+# Extraction patterns carry the lowercase literal each needs to match
+# (None when there is no such literal); a pattern is only run when its
+# trigger occurs in the lowercased text
+
+_PART_NUMBER_PATTERNS = (
+    ('3g', re.compile(r'\b(3G\d{4}[A-Z0-9-]+)\b', re.IGNORECASE), "AW139 Component"),
+    ('-', re.compile(r'\b(\d{3}-\d{4}-\d{2}-\d{2})\b', re.IGNORECASE), "Assembly Part"),
+    ('109-', re.compile(r'\b(109-\d{4}-\d{2}-\d{2})\b', re.IGNORECASE), "Honeywell Component"),
+    ('p/n', re.compile(r'P/N[:\s]*([A-Z0-9-]{6,})', re.IGNORECASE), "Identified Part"),
+    (None, re.compile(r'\b([A-Z]{2,3}\d{5,}[A-Z0-9-]*)\b', re.IGNORECASE), "Aircraft Part"),
+)
+
+def _scan_part_numbers(text: str, text_lower: str) -> List[Dict[str, str]]:
+    """extract_part_numbers over a text whose lowercase form is already known."""
+    # Insertion-ordered: the first pattern to find a part number describes it
+    parts_by_pn: Dict[str, Dict[str, str]] = {}
+    
+    for trigger, pattern, desc_prefix in _PART_NUMBER_PATTERNS:
+        if trigger is not None and trigger not in text_lower:
+            continue
+        for match in pattern.finditer(text):
             pn = match.group(1).upper()
-            if pn not in seen and len(pn) >= 6:
-                seen.add(pn)
-                parts.append({
+            if pn not in parts_by_pn and len(pn) >= 6:
+                parts_by_pn[pn] = {
                     "part_number": pn,
                     "description": f"{desc_prefix}",
                     "location": "See maintenance manual for location",
                     "action": "INSPECT"
-                })
+                }
+                if len(parts_by_pn) == 10:
+                    return list(parts_by_pn.values())
     
-    return parts[:10]
+    return list(parts_by_pn.values())
 
-def extract_ata_chapter(text: str) -> str:
-    """Extract ATA chapter from text."""
-    patterns = [
-        r'ATA[:\s]*(\d{2})[-\s](\d{2})',
-        r'ATA Chapter[:\s]*(\d{2})',
-        r'ATA[:\s]*(\d{2})\b',
-    ]
-    
-    for pattern in patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
+def extract_part_numbers(text: str) -> List[Dict[str, str]]:
+    """Extract real part numbers from text."""
+    return _scan_part_numbers(text, text.lower())
+
+_ATA_CHAPTER_PATTERNS = (
+    ('ata', re.compile(r'ATA[:\s]*(\d{2})[-\s](\d{2})', re.IGNORECASE)),
+    ('ata chapter', re.compile(r'ATA Chapter[:\s]*(\d{2})', re.IGNORECASE)),
+    ('ata', re.compile(r'ATA[:\s]*(\d{2})\b', re.IGNORECASE)),
+)
+
+def _scan_ata_chapter(text: str, text_lower: str) -> str:
+    """extract_ata_chapter over a text whose lowercase form is already known."""
+    for trigger, pattern in _ATA_CHAPTER_PATTERNS:
+        if trigger not in text_lower:
+            continue
+        match = pattern.search(text)
         if match:
             if len(match.groups()) >= 2:
                 return f"ATA {match.group(1)}-{match.group(2)}"
@@ -306,41 +751,81 @@ def extract_ata_chapter(text: str) -> str:
     
     return ""
 
+def extract_ata_chapter(text: str) -> str:
+    """Extract ATA chapter from text."""
+    return _scan_ata_chapter(text, text.lower())
+
+# IPD/FIM/IETP triggers avoid the letter i, which re.IGNORECASE also
+# matches as Turkish dotted/dotless I
+# AMM/AMP/AWD/FIM/CMM references only contain separators and digits after
+# their prefix, so they can never overlap and share one scan; each family
+# keeps its own capture group so results stay grouped in the original order
+_REFERENCE_FAMILIES_RE = re.compile(
+    r'(?=[AFC][MWI][MPD][-\s])'  # shared prefix shape, rejects most positions cheaply
+    r'(?:(AMM[-\s]\d{2}[-\s]\d{2}[-\s]\d{2,4})|'
+    r'(AMP[-\s]\d{2}[-\s]\d{2}[-\s]\d{2,4})|'
+    r'(AWD[-\s]\d{2}[-\s]\d{2}[-\s]\d{2,4})|'
+    r'(FIM[-\s]\d{2}[-\s]\d{2})|'
+    r'(CMM[-\s]\d{2}[-\s]\d{2}))',
+    re.IGNORECASE
+)
+
+# Output order: a group index of _REFERENCE_FAMILIES_RE, or (trigger, pattern)
+# for IPD/IETP, whose free-form bodies may contain other references
+_REFERENCE_ORDER = (
+    1, 2, 3,
+    ('pd', re.compile(r'(IPD[-\s][A-Z0-9-]+)', re.IGNORECASE)),
+    4,
+    ('aw139', re.compile(r'(IETP[-\s]AW139[-\s][A-Z0-9-]+)', re.IGNORECASE)),
+    5,
+)
+
+def _scan_references(text: str, text_lower: str) -> List[str]:
+    """extract_references over a text whose lowercase form is already known."""
+    by_family: Dict[int, List[str]] = {}
+    for match in _REFERENCE_FAMILIES_RE.finditer(text):
+        by_family.setdefault(match.lastindex, []).append(match.group(match.lastindex))
+    
+    refs: Dict[str, None] = {}
+    for step in _REFERENCE_ORDER:
+        if isinstance(step, int):
+            found = by_family.get(step, ())
+        else:
+            trigger, pattern = step
+            if trigger not in text_lower:
+                continue
+            found = (match.group(1) for match in pattern.finditer(text))
+        for ref in found:
+            refs.setdefault(ref.upper().replace(" ", "-"), None)
+            if len(refs) == 15:
+                return list(refs)
+    
+    return list(refs)
+
 def extract_references(text: str) -> List[str]:
     """Extract manual references from text."""
-    refs = []
-    seen = set()
-    
-    patterns = [
-        r'(AMM[-\s]\d{2}[-\s]\d{2}[-\s]\d{2,4})',
-        r'(AMP[-\s]\d{2}[-\s]\d{2}[-\s]\d{2,4})',
-        r'(AWD[-\s]\d{2}[-\s]\d{2}[-\s]\d{2,4})',
-        r'(IPD[-\s][A-Z0-9-]+)',
-        r'(FIM[-\s]\d{2}[-\s]\d{2})',
-        r'(IETP[-\s]AW139[-\s][A-Z0-9-]+)',
-        r'(CMM[-\s]\d{2}[-\s]\d{2})',
-    ]
-    
-    for pattern in patterns:
-        for match in re.finditer(pattern, text, re.IGNORECASE):
-            ref = match.group(1).upper().replace(" ", "-")
-            if ref not in seen:
-                seen.add(ref)
-                refs.append(ref)
-    
-    return refs[:15]
-
-def extract_likely_causes(text: str) -> List[Dict[str, Any]]:
-    """Extract likely causes with probabilities."""
-    causes = []
-    
-    cause_patterns = [
-        (r'(\d{1,3})\s*%[:\s]*([^.\n]+)', True),
-        (r'([^.\n]+)\s*\((\d{1,3})\s*%\)', False),
-    ]
-    
-    for pattern, prob_first in cause_patterns:
-        for match in re.finditer(pattern, text):
+    return _scan_references(text, text.lower())
+
+def extract_all(text: str, text_lower: Optional[str] = None) -> Dict[str, Any]:
+    """Extract part numbers, manual references and ATA chapter sharing one lowercase pass."""
+    if text_lower is None:
+        text_lower = text.lower()
+    return {
+        "parts": _scan_part_numbers(text, text_lower),
+        "references": _scan_references(text, text_lower),
+        "ata_chapter": _scan_ata_chapter(text, text_lower),
+    }
+
+# (pattern, probability appears before the cause)
+_LIKELY_CAUSE_PATTERNS = (
+    (re.compile(r'(\d{1,3})\s*%[:\s]*([^.\n]+)'), True),
+    (re.compile(r'([^.\n]+)\s*\((\d{1,3})\s*%\)'), False),
+)
+
+def _iter_likely_causes(text: str):
+    """Yield every cause stated with a percentage, in pattern order."""
+    for pattern, prob_first in _LIKELY_CAUSE_PATTERNS:
+        for match in pattern.finditer(text):
             if prob_first:
                 prob = int(match.group(1))
                 cause = match.group(2).strip()
@@ -349,47 +834,64 @@ def extract_likely_causes(text: str) -> List[Dict[str, Any]]:
                 prob = int(match.group(2))
             
             if 5 <= prob <= 100 and len(cause) > 10:
-                causes.append({
+                yield {
                     "cause": cause[:100],
                     "probability": prob,
                     "reasoning": "Based on symptom analysis and documentation match"
-                })
+                }
+
+def _cause_probability(cause: Dict[str, Any]) -> int:
+    """Sort key for extracted causes."""
+    return cause["probability"]
+
+# Generic causes reported, in table order, when the text states none with a percentage
+_FALLBACK_CAUSE_KEYWORDS = (
+    ("electrical", "Electrical Connection Issue", 30),
+    ("component", "Component Failure", 35),
+    ("wiring", "Wiring Fault", 25),
+    ("corrosion", "Corrosion", 15),
+    ("wear", "Mechanical Wear", 20),
+    ("sensor", "Sensor Malfunction", 25),
+    ("connector", "Connector Issue", 20),
+)
+
+def extract_likely_causes(text: str, text_lower: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Extract likely causes with probabilities; text_lower is reused by the keyword fallback."""
+    # nlargest keeps only the running top 5 and breaks ties by match
+    # order, exactly like a stable sort followed by [:5]
+    causes = heapq.nlargest(5, _iter_likely_causes(text), key=_cause_probability)
     
     if not causes:
-        keywords = [
-            ("electrical", "Electrical Connection Issue", 30),
-            ("component", "Component Failure", 35),
-            ("wiring", "Wiring Fault", 25),
-            ("corrosion", "Corrosion", 15),
-            ("wear", "Mechanical Wear", 20),
-            ("sensor", "Sensor Malfunction", 25),
-            ("connector", "Connector Issue", 20),
-        ]
-        
-        text_lower = text.lower()
-        for keyword, cause, prob in keywords:
-            if keyword in text_lower and len(causes) < 3:
+        if text_lower is None:
+            text_lower = text.lower()
+        for keyword, cause, prob in _FALLBACK_CAUSE_KEYWORDS:
+            if keyword in text_lower:
                 causes.append({
                     "cause": cause,
                     "probability": prob,
                     "reasoning": "Based on symptom analysis and documentation match"
                 })
+                if len(causes) == 3:
+                    break
+        causes.sort(key=_cause_probability, reverse=True)
     
-    causes.sort(key=lambda x: x["probability"], reverse=True)
-    return causes[:5]
+    return causes
+
+# Sentences are the runs of text between . ! and ?
+_SENTENCE_RE = re.compile(r'[^.!?]+')
+_TEST_KEYWORDS = ("test", "check", "verify", "inspect", "measure", "continuity")
+_TEST_REF_RE = re.compile(r'(AMP|AWD|AMM)[-\s]?\d{2}[-\s]?\d{2}', re.IGNORECASE)
 
 def extract_recommended_tests(text: str, ata: str) -> List[Dict[str, Any]]:
     """Extract recommended test procedures."""
     tests = []
     
-    test_keywords = ["test", "check", "verify", "inspect", "measure", "continuity"]
-    sentences = re.split(r'[.!?]', text)
-    
     step = 1
-    for sentence in sentences:
-        sentence = sentence.strip()
-        if any(kw in sentence.lower() for kw in test_keywords) and len(sentence) > 20:
-            ref_match = re.search(r'(AMP|AWD|AMM)[-\s]?\d{2}[-\s]?\d{2}', sentence, re.IGNORECASE)
+    # Sentences are scanned lazily so long texts stop at the sixth test
+    for match in _SENTENCE_RE.finditer(text):
+        sentence = match.group().strip()
+        if len(sentence) > 20 and any(kw in sentence.lower() for kw in _TEST_KEYWORDS):
+            ref_match = _TEST_REF_RE.search(sentence)
             ref = ref_match.group(0).upper() if ref_match else f"AMP-{ata.replace('ATA ', '')}-00" if ata else "AMP-XX-XX"
             
             tests.append({
@@ -428,13 +930,276 @@ def extract_recommended_tests(text: str, ata: str) -> List[Dict[str, Any]]:
     
     return tests
 
+# ======================================================================
+# CERTAINTY SCORE PATTERNS
+# ======================================================================
+
+# Training-material ATA filters and the keywords that mark a matching doc
+_TRAINING_KEYWORDS = {
+    "PRIMUS_EPIC": ("primus", "epic", "avionics", "cmc", "fms"),
+    "PT6C_67CD": ("pt6c", "67c", "engine", "turbine", "power plant"),
+    "AW139_AIRFRAME": ("airframe", "structure", "fuselage", "cabin"),
+}
+
+# Every scorer pattern runs against the lowercased diagnosis, so none of
+# them needs re.IGNORECASE
+_REAL_DMC_RE = re.compile(r'\b\d{2}-[a-z]-\d{2}-\d{2}-\d{2}-\d{2}[a-z]?')
+_IETP_DMC_CODE_RE = re.compile(r'\b\d{2}-[a-z]-\d{2}-\d{2}-\d{2}-\d{2}[a-z]-\d{3}[a-z]-[a-z]\b')
+_AMP_REF_RE = re.compile(r'\b(?:amp|amm)\s*[-:]?\s*\d{2}[-]\d{2}[-]\d{2}')
+_AWDP_REF_RE = re.compile(r'\b(?:awd|awdp)\s*[-:]?\s*\d{2}')
+_REAL_PART_NUMBER_RE = re.compile(r'\b(?:3g\d{4}[a-z0-9-]+|\d{3}-\d{4}-\d{2}|p/n\s*[a-z0-9-]{6,})\b')
+_SPECIFIC_COMPONENT_RE = re.compile(
+    r'\b(?:actuator|valve|pump|generator|starter|relay|contactor|'
+    r'solenoid|bearing|seal|bushing|link|rod|arm|gear|shaft|'
+    r'damper|accumulator|filter|regulator|transducer|'
+    r'steering|shimmy|oleo|strut|torque\s*link|scissor|'
+    r'swashplate|servo|pitch\s*link|collective|pedal|'
+    r'connector|harness|bus|breaker|ground\s*point)\b'
+)
+_CAUSAL_REASONING_RE = re.compile(
+    r'\b(?:because|due to|caused by|resulting from|leads to|'
+    r'prevents|restricts|blocks|fails to|unable to|'
+    r'when .{5,40} the .{5,30} (?:cannot|does not|fails|stops)|'
+    r'if .{5,30} then .{5,30}|'
+    r'this (?:causes|results|prevents|restricts))\b'
+)
+_MECHANISM_EXPLANATION_RE = re.compile(
+    r'\b(?:mechanism|assembly|linkage|hydraulic\s*(?:line|circuit|system)|'
+    r'electrical\s*(?:circuit|path|bus)|control\s*(?:chain|path|loop)|'
+    r'mechanical\s*(?:connection|linkage|system)|'
+    r'steering\s*(?:mechanism|system|assembly)|'
+    r'how (?:the|this) .{5,40} works|'
+    r'the .{5,30} is (?:connected|linked|driven|controlled) by)\b'
+)
+_SPECIFIC_LOCATION_RE = re.compile(
+    r'\b(?:lh|rh|left|right|forward|aft|upper|lower|inboard|outboard|'
+    r'station\s*\d|frame\s*\d|bay\s*\d|zone\s*\d|'
+    r'panel\s*[a-z0-9]|rack\s*\d|shelf\s*\d)\b'
+)
+_FAILURE_MODE_RE = re.compile(
+    r'\b(?:worn|corroded|seized|cracked|broken|leaking|loose|'
+    r'intermittent|open\s*circuit|short\s*circuit|grounded|'
+    r'binding|sticking|jamm(?:ed|ing)|frozen|stripped|'
+    r'fatigued|deformed|contaminated|degraded|misaligned)\b'
+)
+_SIGNAL_PATH_RE = re.compile(
+    r'\b(?:signal\s*(?:path|flow|chain)|circuit\s*(?:path|trace|analysis)|'
+    r'in\s*series\s*with|in\s*parallel\s*with|'
+    r'from\s*(?:the\s*)?(?:switch|sensor|relay)\s*(?:to|through)|'
+    r'power\s*(?:flows?|supply|path)|ground\s*(?:path|return|circuit)|'
+    r'pin\s*\d+|connector\s*[A-Z]?\d+|wire\s*(?:number|#|\d)|'
+    r'functional\s*chain|component\s*(?:path|chain|in\s*the\s*circuit))\b'
+)
+_SYSTEM_OPERATION_RE = re.compile(
+    r'\b(?:(?:the\s*)?system\s*(?:works|operates|functions)\s*by|'
+    r'when\s*(?:the\s*)?(?:gear|switch|valve|relay|sensor)\s*(?:is|moves|activates)|'
+    r'(?:this|the)\s*(?:sends?|provides?|generates?)\s*(?:a\s*)?signal|'
+    r'the\s*(?:indicator|light|annunciator)\s*(?:illuminates?|shows?|displays?)\s*(?:when|because)|'
+    r'under\s*normal\s*(?:operation|conditions)|'
+    r'the\s*circuit\s*(?:is\s*)?(?:completed?|opened?|broken)\s*(?:when|by|through))\b'
+)
+_PROCEDURE_STEPS_RE = re.compile(
+    r'\b(?:step\s*\d|procedure|install|remove|disconnect|connect|'
+    r'torque|tighten|loosen|secure|safety\s*wire|lock\s*wire|'
+    r'position|align|adjust|calibrate|set\s*to|rig|'
+    r'apply|lubricate|clean|inspect before|inspect after|'
+    r'ensure|verify|confirm|record|note)\b'
+)
+_TOOL_REFERENCE_RE = re.compile(
+    r'\b(?:torque\s*(?:wrench|value|to)|ft[\.\s-]*lb|in[\.\s-]*lb|N[\.\s]*m|'
+    r'tool\s*(?:number|p/n|#)|wrench|socket|driver|gauge|'
+    r'feeler\s*gauge|dial\s*indicator|micrometer|caliper|'
+    r'multimeter|megger|test\s*set|adapter|fixture|jig|'
+    r'special\s*tool|gse|ground\s*support)\b'
+)
+_SAFETY_NOTE_RE = re.compile(
+    r'\b(?:caution|warning|note|danger|critical|'
+    r'do\s*not|never|ensure\s*that|before\s*(?:removing|installing|adjusting)|'
+    r'safety\s*(?:precaution|note|wire)|personal\s*protective|ppe|'
+    r'depressurize|de-energize|isolate|lockout)\b'
+)
+_SEQUENCE_ORDER_RE = re.compile(
+    r'(?:first|then|next|after|before|finally|subsequently|'
+    r'step\s*[1-9]|(?:^|\n)\s*\d+[\.\)]\s)'
+)
+_CONNECTOR_PIN_RE = re.compile(r'\b(?:pin\s*\d+|connector\s*[a-z]?\d|plug\s*[a-z]?\d)\b')
+_CONNECTOR_PIN_LITERALS = ('pin', 'connector', 'plug')
+
+_PROBABILITY_PHRASE_RE = re.compile(r'\b\d{1,3}\s*%\s*(?:probability|likely|likelihood|chance)')
+_SUSPECT_RANKING_RE = re.compile(r'(?:most\s*likely|most\s*probable|primary\s*suspect|first\s*suspect)')
+_PERCENTAGE_RE = re.compile(r'\b\d{1,3}\s*%')
+
+# (name, unit literals every match must contain or None, pattern); the literal
+# gate skips the regex pass on diagnoses that never mention the unit
+_EVIDENCE_PATTERNS = (
+    ('torque', None, re.compile(r'\b\d+\.?\d*\s*(?:n\s*m|nm|lbf?\s*in|lb-in|ft-lb|lb-ft)\b')),
+    ('pressure', ('psi', 'bar', 'kpa', 'mpa'), re.compile(r'\b\d+\.?\d*\s*(?:psi|bar|kpa|mpa)\b')),
+    ('voltage', None, re.compile(r'\b\d+\.?\d*\s*(?:v|mv|kv)\b')),
+    ('current', None, re.compile(r'\b\d+\.?\d*\s*(?:a|ma)\b')),
+    ('temperature', None, re.compile(r'\b-?\d+\.?\d*\s*°?(?:c|f)\b')),
+    ('dimension', None, re.compile(r'\b\d+\.?\d*\s*(?:mm|cm|m|in|ft)\b')),
+    ('resistance', ('ohm', 'ω'), re.compile(r'\b\d+\.?\d*\s*(?:ohm|ω|kohm|mω)\b')),
+)
+
+_GENERIC_CHECK_PHRASES = ('check continuity', 'verify wiring', 'inspect connector', 'check hydraulic')
+
+# Query noise stripped before keyword overlap: [tags], ATA codes, aircraft/serial
+_QUERY_NOISE_RES = (
+    re.compile(r'\[.*?\]'),
+    re.compile(r'ata\s*\d+'),
+    re.compile(r'aw139|s/n:?\s*\d+'),
+)
+_QUERY_WORD_RE = re.compile(r'\b[a-z]{4,}\b')
+_QUERY_STOP_WORDS = frozenset({
+    'does', 'have', 'been', 'with', 'that', 'this', 'from', 'what',
+    'when', 'where', 'which', 'there', 'their', 'about', 'would',
+    'could', 'should', 'during', 'before', 'after', 'helicopter',
+    'aircraft', 'system', 'problem', 'issue', 'fault', 'check',
+})
+
+# Maps query concepts to required subsystem components in the diagnosis
+# E.g., "not turning left" -> must discuss steering/nose gear mechanism
+_SUBSYSTEM_MAP = {
+    'steering': {
+        'triggers': ['turn', 'turning', 'steer', 'steering', 'taxi', 'taxing', 'taxiing', 'ground maneuver'],
+        'required': ['steering', 'nose wheel', 'nosewheel', 'nose gear', 'nose landing gear',
+                     'shimmy damper', 'torque link', 'steering actuator', 'steering valve',
+                     'steering cylinder', 'castering', 'tiller'],
+        'label': 'Nose Wheel Steering System'
+    },
+    'landing_gear': {
+        'triggers': ['landing gear', 'gear', 'retract', 'extend', 'gear up', 'gear down',
+                     'squat switch', 'weight on wheels', 'wow'],
+        'required': ['landing gear', 'actuator', 'uplock', 'downlock', 'squat switch',
+                     'gear door', 'oleo', 'strut', 'retract', 'extend', 'selector valve'],
+        'label': 'Landing Gear System'
+    },
+    'hydraulic': {
+        'triggers': ['hydraulic', 'pressure', 'pump', 'fluid', 'leak'],
+        'required': ['hydraulic pump', 'reservoir', 'accumulator', 'pressure switch',
+                     'relief valve', 'hydraulic module', 'servo', 'actuator', 'manifold',
+                     'filter', 'hydraulic system'],
+        'label': 'Hydraulic System'
+    },
+    'engine': {
+        'triggers': ['engine', 'turbine', 'power', 'torque', 'ng', 'np', 'itt', 'start',
+                     'hot start', 'hung start', 'flameout', 'ecu', 'fadec'],
+        'required': ['engine', 'turbine', 'compressor', 'combustion', 'fuel control',
+                     'fuel nozzle', 'igniter', 'gearbox', 'oil', 'bearing', 'fadec', 'ecu'],
+        'label': 'Engine/Powerplant System'
+    },
+    'electrical': {
+        'triggers': ['generator', 'battery', 'bus', 'power loss', 'electrical', 'voltage',
+                     'breaker', 'tripped', 'no power'],
+        'required': ['generator', 'battery', 'bus', 'contactor', 'breaker', 'relay',
+                     'transformer', 'rectifier', 'inverter', 'gcr', 'gcb', 'btb'],
+        'label': 'Electrical Power System'
+    },
+    'flight_controls': {
+        'triggers': ['cyclic', 'collective', 'pedal', 'yaw', 'pitch', 'roll',
+                     'autopilot', 'trim', 'stick', 'vibration'],
+        'required': ['servo', 'actuator', 'swashplate', 'pitch link', 'mixing unit',
+                     'trim', 'boost', 'feel spring', 'gradient unit', 'autopilot'],
+        'label': 'Flight Control System'
+    },
+    'rotor': {
+        'triggers': ['rotor', 'blade', 'hub', 'mast', 'tail rotor', 'main rotor',
+                     'track', 'balance', 'vibration', 'lead-lag'],
+        'required': ['rotor', 'blade', 'hub', 'damper', 'bearing', 'pitch horn',
+                     'lead-lag', 'drag brace', 'elastomeric', 'spindle'],
+        'label': 'Rotor System'
+    },
+    'avionics': {
+        'triggers': ['display', 'screen', 'cas', 'warning', 'caution', 'advisory',
+                     'radio', 'nav', 'gps', 'transponder', 'ahrs', 'adc'],
+        'required': ['display', 'processor', 'symbol generator', 'dmu', 'dcu',
+                     'sensor', 'computer', 'bus', 'arinc', 'can bus'],
+        'label': 'Avionics System'
+    },
+    'fuel': {
+        'triggers': ['fuel', 'tank', 'boost pump', 'transfer', 'crossfeed', 'quantity'],
+        'required': ['fuel pump', 'fuel tank', 'fuel valve', 'boost pump', 'transfer pump',
+                     'crossfeed', 'fuel quantity', 'fuel filter', 'fuel line'],
+        'label': 'Fuel System'
+    },
+}
+
+def _substring_scanner(terms):
+    """Compile a one-pass scanner reporting every term that occurs in a text."""
+    # Longest-first lookahead captures the longest term starting at each
+    # position; any shorter term hiding inside it is recovered via `implied`
+    ordered = sorted(set(terms), key=len, reverse=True)
+    pattern = re.compile('(?=(' + '|'.join(map(re.escape, ordered)) + '))')
+    implied = {term: frozenset(t for t in ordered if t in term) for term in ordered}
+    return pattern, implied
+
+def _find_substrings(scanner, text: str) -> set:
+    """Return the set of scanner terms that appear anywhere in text."""
+    pattern, implied = scanner
+    hits = set()
+    for term in set(pattern.findall(text)):
+        hits |= implied[term]
+    return hits
+
+# Reverse index: query trigger -> subsystems it implies
+_TRIGGER_TO_SUBSYS: Dict[str, List[str]] = {}
+for _subsys_name, _subsys_data in _SUBSYSTEM_MAP.items():
+    for _trigger in _subsys_data['triggers']:
+        _TRIGGER_TO_SUBSYS.setdefault(_trigger, []).append(_subsys_name)
+
+# Query words suggesting a mechanical problem, and diagnosis terms that
+# suggest electrical troubleshooting (penalized together when no mechanism
+# is analyzed)
+_MECHANICAL_QUERY_TRIGGERS = ('turn', 'steering', 'gear', 'stuck', 'binding', 'seized', 'jam', 'stiff',
+                              'vibration', 'noise', 'grind', 'click', 'play', 'loose', 'worn')
+_ELECTRICAL_CHECK_TERMS = ('continuity', 'wiring', 'circuit', 'resistance', 'voltage')
+
+# One pass over the query reports both subsystem triggers and mechanical words
+_QUERY_TERM_SCANNER = _substring_scanner([*_TRIGGER_TO_SUBSYS, *_MECHANICAL_QUERY_TRIGGERS])
+
+def _count_matching_docs(docs: List[Dict[str, Any]], ata_filter: str) -> tuple:
+    """Count RAG docs from the selected manual, and how many of those are high-relevance."""
+    ata_code = ata_filter.replace("ATA ", "").strip() if ata_filter else ""
+    training_keywords = _TRAINING_KEYWORDS.get(ata_filter)
+    ata_path_marker = f"-{ata_code[:2]}-"
+    matching_docs = 0
+    high_relevance_docs = 0
+    
+    for doc in docs:
+        doc_score = doc.get("score", 0) or doc.get("similarity", 0)
+        
+        # Only training-material filters look at content, and only when
+        # the path alone does not match
+        is_match = False
+        if training_keywords is not None:
+            doc_path = doc.get("doc_path", "").lower()
+            if any(kw in doc_path for kw in training_keywords):
+                is_match = True
+            else:
+                doc_content = doc.get("content", "").lower()
+                is_match = any(kw in doc_content for kw in training_keywords)
+        elif ata_code:
+            is_match = ata_path_marker in doc.get("doc_path", "").lower()
+        else:
+            is_match = True
+        
+        if is_match:
+            matching_docs += 1
+            if isinstance(doc_score, (int, float)) and doc_score > 0.7:
+                high_relevance_docs += 1
+    
+    return matching_docs, high_relevance_docs
+
+_NO_RAG_CONTENT_PREFIX = "Unable to retrieve documentation for query: "
+
 def calculate_certainty_score(
     rag_result: Dict[str, Any], 
     diagnosis: str, 
     query: str = "", 
     ata_filter: str = "",
     task_type: str = "fault_isolation",
-    has_awdp: bool = False
+    has_awdp: bool = False,
+    diagnosis_lower: Optional[str] = None
 ) -> Dict[str, Any]:
     """
     RIGOROUS CERTAINTY SCORE ENGINE v3.2 - Deep System Analysis Support
@@ -455,24 +1220,56 @@ def calculate_certainty_score(
     - Fault isolation without AWDP analysis: capped at 85%
     - Generic diagnosis without specific part/component analysis: capped at 80%
     - No specific DMC/AMP references: capped at 85%
+    
+    Callers that already lowercased the diagnosis pass it as diagnosis_lower.
     """
     docs = rag_result.get("documents") or rag_result.get("chunks") or []
-    doc_count = len(docs)
-    diagnosis_lower = diagnosis.lower()
+    if not docs and diagnosis.startswith(_NO_RAG_CONTENT_PREFIX):
+        # Fallback text from format_diagnosis_text: nothing to score but the echoed query
+        return {
+            "score": 40,
+            "breakdown": {},
+            "can_exceed_95": False,
+            "caps_applied": ["No RAG content"],
+            "evidence_found": [],
+            "is_procedure_type": task_type in PROCEDURE_TASK_TYPES,
+            "has_ietp_dmc_code": False
+        }
+    doc_stats = (len(docs), *_count_matching_docs(docs, ata_filter)) if docs else (0, 0, 0)
+    if diagnosis_lower is None:
+        diagnosis_lower = diagnosis.lower()
+    return _score_diagnosis(doc_stats, diagnosis_lower, query, ata_filter, task_type, has_awdp)
+
+# Repeated requests (batch items, retries, stream and JSON endpoints) re-score
+# the same text, so scores are memoized on the summarized inputs
+@lru_cache(maxsize=256)
+def _score_diagnosis(
+    doc_stats: tuple,
+    diagnosis_lower: str,
+    query: str,
+    ata_filter: str,
+    task_type: str,
+    has_awdp: bool
+) -> Dict[str, Any]:
+    """calculate_certainty_score over (doc_count, matching_docs, high_relevance_docs).
+    
+    Only the lowercased diagnosis is scored, so it is also the cache key.
+    The returned dict is shared by every caller with the same inputs; treat it as read-only.
+    """
+    doc_count, matching_docs, high_relevance_docs = doc_stats
     query_lower = query.lower() if query else ""
     
     # Task type classification (used throughout scoring)
-    is_fault_type = task_type in ["fault_isolation", "operational_test", "functional_test"]
-    is_procedure_type = task_type in ["remove_procedure", "install_procedure", "disassembly", "assembly",
-                                       "adjustment", "rigging_procedure", "bonding_check", "detailed_inspection",
-                                       "system_description"]
-    
-    print(f"[CrewAI] === CERTAINTY SCORE v3.2 - DEEP SYSTEM ANALYSIS SUPPORT ===")
-    print(f"[CrewAI] Query: {query[:80]}...")
-    print(f"[CrewAI] ATA Filter: {ata_filter}")
-    print(f"[CrewAI] Task Type: {task_type} ({'PROCEDURE' if is_procedure_type else 'FAULT_ISOLATION' if is_fault_type else 'OTHER'})")
-    print(f"[CrewAI] AWDP Found: {has_awdp}")
-    print(f"[CrewAI] Documents found: {doc_count}")
+    is_fault_type = task_type in FAULT_TASK_TYPES
+    is_procedure_type = task_type in PROCEDURE_TASK_TYPES
+    
+    logger.debug("[CrewAI] === CERTAINTY SCORE v3.2 - DEEP SYSTEM ANALYSIS SUPPORT ===")
+    logger.debug("[CrewAI] Query: %.80s...", query)
+    logger.debug("[CrewAI] ATA Filter: %s", ata_filter)
+    logger.debug("[CrewAI] Task Type: %s (%s)", task_type,
+                 'PROCEDURE' if is_procedure_type else 'FAULT_ISOLATION' if is_fault_type else 'OTHER')
+    logger.debug("[CrewAI] AWDP Found: %s", has_awdp)
+    logger.debug("[CrewAI] Documents found: %d", doc_count)
     
     # =========================================================================
     # 1. COVERAGE SCORE (0-100%) - Weight: 25%
@@ -486,34 +1283,6 @@ def calculate_certainty_score(
         coverage_score = 0
         coverage_details.append("CRITICAL: No documents found in RAG")
     else:
-        ata_code = ata_filter.replace("ATA ", "").strip() if ata_filter else ""
-        matching_docs = 0
-        high_relevance_docs = 0
-        
-        for doc in docs:
-            doc_path = doc.get("doc_path", "").lower()
-            doc_content = doc.get("content", "").lower()
-            doc_score = doc.get("score", 0) or doc.get("similarity", 0)
-            
-            is_match = False
-            if ata_filter in ["PRIMUS_EPIC", "PT6C_67CD", "AW139_AIRFRAME"]:
-                training_keywords = {
-                    "PRIMUS_EPIC": ["primus", "epic", "avionics", "cmc", "fms"],
-                    "PT6C_67CD": ["pt6c", "67c", "engine", "turbine", "power plant"],
-                    "AW139_AIRFRAME": ["airframe", "structure", "fuselage", "cabin"]
-                }
-                if any(kw in doc_content or kw in doc_path for kw in training_keywords.get(ata_filter, [])):
-                    is_match = True
-            elif ata_code and f"-{ata_code[:2]}-" in doc_path:
-                is_match = True
-            elif not ata_code:
-                is_match = True
-            
-            if is_match:
-                matching_docs += 1
-                if isinstance(doc_score, (int, float)) and doc_score > 0.7:
-                    high_relevance_docs += 1
-        
         if doc_count > 0:
             coverage_ratio = matching_docs / doc_count
             if coverage_ratio >= 0.8 and high_relevance_docs >= 3:
@@ -532,23 +1301,19 @@ def calculate_certainty_score(
                 coverage_score = 15
                 coverage_details.append(f"Poor: Only {matching_docs}/{doc_count} docs from selected manual")
     
-    print(f"[CrewAI] Coverage Score: {coverage_score}% - {coverage_details}")
+    logger.debug("[CrewAI] Coverage Score: %s%% - %s", coverage_score, coverage_details)
     
     # =========================================================================
     # PRE-DETECTION: Evidence flags needed by multiple scoring components
     # Detected early so System Analysis can use them for procedure scoring
     # =========================================================================
-    has_real_dmc = bool(re.search(
-        r'\b\d{2}-[A-Z]-\d{2}-\d{2}-\d{2}-\d{2}[A-Z]?',
-        diagnosis, re.IGNORECASE
-    ))
-    has_ietp_dmc_code = bool(re.search(
-        r'\b\d{2}-[A-Z]-\d{2}-\d{2}-\d{2}-\d{2}[A-Z]-\d{3}[A-Z]-[A-Z]\b',
-        diagnosis, re.IGNORECASE
-    ))
-    has_amp_ref = bool(re.search(r'\b(?:AMP|AMM)\s*[-:]?\s*\d{2}[-]\d{2}[-]\d{2}', diagnosis, re.IGNORECASE))
-    has_awdp_ref = bool(re.search(r'\b(?:AWD|AWDP)\s*[-:]?\s*\d{2}', diagnosis, re.IGNORECASE))
-    has_real_part_number = bool(re.search(r'\b(?:3G\d{4}[A-Z0-9-]+|\d{3}-\d{4}-\d{2}|P/N\s*[A-Z0-9-]{6,})\b', diagnosis, re.IGNORECASE))
+    has_real_dmc = bool(_REAL_DMC_RE.search(diagnosis_lower))
+    # A full IETP DMC code always contains a real DMC prefix
+    has_ietp_dmc_code = has_real_dmc and bool(_IETP_DMC_CODE_RE.search(diagnosis_lower))
+    has_amp_ref = ('amp' in diagnosis_lower or 'amm' in diagnosis_lower) and \
+                  bool(_AMP_REF_RE.search(diagnosis_lower))
+    has_awdp_ref = 'awd' in diagnosis_lower and bool(_AWDP_REF_RE.search(diagnosis_lower))
+    has_real_part_number = bool(_REAL_PART_NUMBER_RE.search(diagnosis_lower))
     
     # =========================================================================
     # 2. SYSTEM ANALYSIS SCORE (0-100%) - Weight: 25%
@@ -558,113 +1323,38 @@ def calculate_certainty_score(
     system_analysis_score = 0
     analysis_details = []
     
-    has_specific_component = bool(re.search(
-        r'\b(?:actuator|valve|pump|generator|starter|relay|contactor|'
-        r'solenoid|bearing|seal|bushing|link|rod|arm|gear|shaft|'
-        r'damper|accumulator|filter|regulator|transducer|'
-        r'steering|shimmy|oleo|strut|torque\s*link|scissor|'
-        r'swashplate|servo|pitch\s*link|collective|pedal|'
-        r'connector|harness|bus|breaker|ground\s*point)\b',
-        diagnosis_lower
-    ))
-    
-    has_causal_reasoning = bool(re.search(
-        r'\b(?:because|due to|caused by|resulting from|leads to|'
-        r'prevents|restricts|blocks|fails to|unable to|'
-        r'when .{5,40} the .{5,30} (?:cannot|does not|fails|stops)|'
-        r'if .{5,30} then .{5,30}|'
-        r'this (?:causes|results|prevents|restricts))\b',
-        diagnosis_lower
-    ))
-    
-    has_mechanism_explanation = bool(re.search(
-        r'\b(?:mechanism|assembly|linkage|hydraulic\s*(?:line|circuit|system)|'
-        r'electrical\s*(?:circuit|path|bus)|control\s*(?:chain|path|loop)|'
-        r'mechanical\s*(?:connection|linkage|system)|'
-        r'steering\s*(?:mechanism|system|assembly)|'
-        r'how (?:the|this) .{5,40} works|'
-        r'the .{5,30} is (?:connected|linked|driven|controlled) by)\b',
-        diagnosis_lower
-    ))
-    
-    has_specific_location = bool(re.search(
-        r'\b(?:LH|RH|left|right|forward|aft|upper|lower|inboard|outboard|'
-        r'station\s*\d|frame\s*\d|bay\s*\d|zone\s*\d|'
-        r'panel\s*[A-Z0-9]|rack\s*\d|shelf\s*\d)\b',
-        diagnosis, re.IGNORECASE
-    ))
-    
-    has_failure_mode = bool(re.search(
-        r'\b(?:worn|corroded|seized|cracked|broken|leaking|loose|'
-        r'intermittent|open\s*circuit|short\s*circuit|grounded|'
-        r'binding|sticking|jamm(?:ed|ing)|frozen|stripped|'
-        r'fatigued|deformed|contaminated|degraded|misaligned)\b',
-        diagnosis_lower
-    ))
+    has_specific_component = bool(_SPECIFIC_COMPONENT_RE.search(diagnosis_lower))
+    
+    has_causal_reasoning = bool(_CAUSAL_REASONING_RE.search(diagnosis_lower))
+    
+    has_mechanism_explanation = bool(_MECHANISM_EXPLANATION_RE.search(diagnosis_lower))
     
     # --- DEEP SYSTEM ANALYSIS DETECTION (signal path, probability ranking) ---
-    has_probability_ranking = bool(re.search(
-        r'\b\d{1,3}\s*%\s*(?:probability|likely|likelihood|chance)',
-        diagnosis_lower
-    )) or bool(re.search(
-        r'(?:most\s*likely|most\s*probable|primary\s*suspect|first\s*suspect)',
-        diagnosis_lower
-    )) or len(re.findall(r'\b\d{1,3}\s*%', diagnosis)) >= 2
-    
-    has_signal_path_analysis = bool(re.search(
-        r'\b(?:signal\s*(?:path|flow|chain)|circuit\s*(?:path|trace|analysis)|'
-        r'in\s*series\s*with|in\s*parallel\s*with|'
-        r'from\s*(?:the\s*)?(?:switch|sensor|relay)\s*(?:to|through)|'
-        r'power\s*(?:flows?|supply|path)|ground\s*(?:path|return|circuit)|'
-        r'pin\s*\d+|connector\s*[A-Z]?\d+|wire\s*(?:number|#|\d)|'
-        r'functional\s*chain|component\s*(?:path|chain|in\s*the\s*circuit))\b',
-        diagnosis_lower
-    ))
-    
-    has_system_operation_analysis = bool(re.search(
-        r'\b(?:(?:the\s*)?system\s*(?:works|operates|functions)\s*by|'
-        r'when\s*(?:the\s*)?(?:gear|switch|valve|relay|sensor)\s*(?:is|moves|activates)|'
-        r'(?:this|the)\s*(?:sends?|provides?|generates?)\s*(?:a\s*)?signal|'
-        r'the\s*(?:indicator|light|annunciator)\s*(?:illuminates?|shows?|displays?)\s*(?:when|because)|'
-        r'under\s*normal\s*(?:operation|conditions)|'
-        r'the\s*circuit\s*(?:is\s*)?(?:completed?|opened?|broken)\s*(?:when|by|through))\b',
-        diagnosis_lower
-    ))
+    has_percent = '%' in diagnosis_lower
+    has_probability_ranking = (has_percent and bool(_PROBABILITY_PHRASE_RE.search(diagnosis_lower))) or \
+                              bool(_SUSPECT_RANKING_RE.search(diagnosis_lower)) or \
+                              (has_percent and
+                               next(islice(_PERCENTAGE_RE.finditer(diagnosis_lower), 1, None), None) is not None)
+    
+    has_signal_path_analysis = bool(_SIGNAL_PATH_RE.search(diagnosis_lower))
+    
+    has_system_operation_analysis = bool(_SYSTEM_OPERATION_RE.search(diagnosis_lower))
+    
+    # Deep system analysis with probability ranking can substitute for missing
+    # causal reasoning; also relaxes the hard caps and the 95% threshold
+    has_deep_analysis = (has_probability_ranking and has_signal_path_analysis) or \
+                       (has_system_operation_analysis and has_probability_ranking) or \
+                       (has_signal_path_analysis and has_mechanism_explanation)
     
     # --- PROCEDURE-SPECIFIC ANALYSIS (install, remove, adjust, rig, etc.) ---
-    has_procedure_steps = bool(re.search(
-        r'\b(?:step\s*\d|procedure|install|remove|disconnect|connect|'
-        r'torque|tighten|loosen|secure|safety\s*wire|lock\s*wire|'
-        r'position|align|adjust|calibrate|set\s*to|rig|'
-        r'apply|lubricate|clean|inspect before|inspect after|'
-        r'ensure|verify|confirm|record|note)\b',
-        diagnosis_lower
-    ))
-    
-    has_tool_reference = bool(re.search(
-        r'\b(?:torque\s*(?:wrench|value|to)|ft[\.\s-]*lb|in[\.\s-]*lb|N[\.\s]*m|'
-        r'tool\s*(?:number|p/n|#)|wrench|socket|driver|gauge|'
-        r'feeler\s*gauge|dial\s*indicator|micrometer|caliper|'
-        r'multimeter|megger|test\s*set|adapter|fixture|jig|'
-        r'special\s*tool|gse|ground\s*support)\b',
-        diagnosis_lower
-    ))
-    
-    has_safety_note = bool(re.search(
-        r'\b(?:caution|warning|note|danger|critical|'
-        r'do\s*not|never|ensure\s*that|before\s*(?:removing|installing|adjusting)|'
-        r'safety\s*(?:precaution|note|wire)|personal\s*protective|ppe|'
-        r'depressurize|de-energize|isolate|lockout)\b',
-        diagnosis_lower
-    ))
-    
-    has_sequence_order = bool(re.search(
-        r'(?:first|then|next|after|before|finally|subsequently|'
-        r'step\s*[1-9]|(?:^|\n)\s*\d+[\.\)]\s)',
-        diagnosis_lower
-    ))
+    has_procedure_steps = bool(_PROCEDURE_STEPS_RE.search(diagnosis_lower))
     
+    # Flags scored by only one branch are scanned inside that branch
     if is_procedure_type:
+        has_tool_reference = bool(_TOOL_REFERENCE_RE.search(diagnosis_lower))
+        has_safety_note = bool(_SAFETY_NOTE_RE.search(diagnosis_lower))
+        has_sequence_order = bool(_SEQUENCE_ORDER_RE.search(diagnosis_lower))
+        
         analysis_points = 0
         if has_specific_component:
             analysis_points += 20
@@ -691,6 +1381,9 @@ def calculate_certainty_score(
             system_analysis_score = min(system_analysis_score, 30)
             analysis_details.append("WARNING: No procedure steps or IETP reference")
     else:
+        has_specific_location = bool(_SPECIFIC_LOCATION_RE.search(diagnosis_lower))
+        has_failure_mode = bool(_FAILURE_MODE_RE.search(diagnosis_lower))
+        
         analysis_points = 0
         if has_specific_component:
             analysis_points += 20
@@ -721,11 +1414,6 @@ def calculate_certainty_score(
         
         system_analysis_score = min(analysis_points, 100)
         
-        # Deep system analysis with probability ranking can substitute for missing causal reasoning
-        has_deep_analysis = (has_probability_ranking and has_signal_path_analysis) or \
-                           (has_system_operation_analysis and has_probability_ranking) or \
-                           (has_signal_path_analysis and has_mechanism_explanation)
-        
         if not has_specific_component and not has_mechanism_explanation and not has_deep_analysis:
             system_analysis_score = min(system_analysis_score, 30)
             analysis_details.append("WARNING: No specific component, mechanism, or deep system analysis")
@@ -735,8 +1423,9 @@ def calculate_certainty_score(
             analysis_details.append("WARNING: No causal reasoning or deep system analysis")
     
     if not is_procedure_type:
-        print(f"[CrewAI] Deep Analysis Flags: probability_ranking={has_probability_ranking}, signal_path={has_signal_path_analysis}, system_operation={has_system_operation_analysis}")
-    print(f"[CrewAI] System Analysis Score: {system_analysis_score}% - {analysis_details}")
+        logger.debug("[CrewAI] Deep Analysis Flags: probability_ranking=%s, signal_path=%s, system_operation=%s",
+                     has_probability_ranking, has_signal_path_analysis, has_system_operation_analysis)
+    logger.debug("[CrewAI] System Analysis Score: %s%% - %s", system_analysis_score, analysis_details)
     
     # =========================================================================
     # 3. EVIDENCE SCORE (0-100%) - Weight: 20%
@@ -748,21 +1437,14 @@ def calculate_certainty_score(
     evidence_details = []
     found_evidence = {}
     
-    evidence_patterns = {
-        'torque': r'\b\d+\.?\d*\s*(?:N\s*m|Nm|lbf?\s*in|lb-in|ft-lb|lb-ft)\b',
-        'pressure': r'\b\d+\.?\d*\s*(?:psi|bar|kPa|MPa)\b',
-        'voltage': r'\b\d+\.?\d*\s*(?:V|mV|kV)\b',
-        'current': r'\b\d+\.?\d*\s*(?:A|mA)\b',
-        'temperature': r'\b-?\d+\.?\d*\s*°?(?:C|F)\b',
-        'dimension': r'\b\d+\.?\d*\s*(?:mm|cm|m|in|ft)\b',
-        'resistance': r'\b\d+\.?\d*\s*(?:ohm|Ω|kohm|MΩ)\b',
-    }
-    
-    for ev_type, pattern in evidence_patterns.items():
-        matches = re.findall(pattern, diagnosis, re.IGNORECASE)
+    for ev_type, units, pattern in _EVIDENCE_PATTERNS:
+        if units is not None and not any(unit in diagnosis_lower for unit in units):
+            continue
+        # Only the count and the family name are reported, so skip building match lists
+        matches = sum(1 for _ in pattern.finditer(diagnosis_lower))
         if matches:
-            found_evidence[ev_type] = matches
-            evidence_count += len(matches)
+            found_evidence[ev_type] = True
+            evidence_count += matches
     
     # Use pre-detected flags (computed before System Analysis)
     if has_real_dmc:
@@ -781,7 +1463,8 @@ def calculate_certainty_score(
         evidence_count += 2
         found_evidence['real_part_number'] = True
     
-    has_connector_pin = bool(re.search(r'\b(?:pin\s*\d+|connector\s*[A-Z]?\d|plug\s*[A-Z]?\d)\b', diagnosis, re.IGNORECASE))
+    has_connector_pin = any(lit in diagnosis_lower for lit in _CONNECTOR_PIN_LITERALS) and \
+                        bool(_CONNECTOR_PIN_RE.search(diagnosis_lower))
     if has_connector_pin:
         evidence_count += 1
         found_evidence['connector_pin'] = True
@@ -800,7 +1483,7 @@ def calculate_certainty_score(
         evidence_score = 100
     
     evidence_details.append(f"Found {evidence_count} evidences: {list(found_evidence.keys())}")
-    print(f"[CrewAI] Evidence Score: {evidence_score}% - {evidence_details}")
+    logger.debug("[CrewAI] Evidence Score: %s%% - %s", evidence_score, evidence_details)
     
     # =========================================================================
     # 4. QUERY-DIAGNOSIS ALIGNMENT SCORE (0-100%) - Weight: 20%
@@ -812,79 +1495,20 @@ def calculate_certainty_score(
     alignment_details = []
     
     # --- SUBSYSTEM INFERENCE ENGINE ---
-    # Maps query concepts to required subsystem components in the diagnosis
     # If the query implies a specific subsystem, the diagnosis MUST mention it
-    subsystem_map = {
-        'steering': {
-            'triggers': ['turn', 'turning', 'steer', 'steering', 'taxi', 'taxing', 'taxiing', 'ground maneuver'],
-            'required': ['steering', 'nose wheel', 'nosewheel', 'nose gear', 'nose landing gear',
-                         'shimmy damper', 'torque link', 'steering actuator', 'steering valve',
-                         'steering cylinder', 'castering', 'tiller'],
-            'label': 'Nose Wheel Steering System'
-        },
-        'landing_gear': {
-            'triggers': ['landing gear', 'gear', 'retract', 'extend', 'gear up', 'gear down',
-                         'squat switch', 'weight on wheels', 'wow'],
-            'required': ['landing gear', 'actuator', 'uplock', 'downlock', 'squat switch',
-                         'gear door', 'oleo', 'strut', 'retract', 'extend', 'selector valve'],
-            'label': 'Landing Gear System'
-        },
-        'hydraulic': {
-            'triggers': ['hydraulic', 'pressure', 'pump', 'fluid', 'leak'],
-            'required': ['hydraulic pump', 'reservoir', 'accumulator', 'pressure switch',
-                         'relief valve', 'hydraulic module', 'servo', 'actuator', 'manifold',
-                         'filter', 'hydraulic system'],
-            'label': 'Hydraulic System'
-        },
-        'engine': {
-            'triggers': ['engine', 'turbine', 'power', 'torque', 'ng', 'np', 'itt', 'start',
-                         'hot start', 'hung start', 'flameout', 'ecu', 'fadec'],
-            'required': ['engine', 'turbine', 'compressor', 'combustion', 'fuel control',
-                         'fuel nozzle', 'igniter', 'gearbox', 'oil', 'bearing', 'fadec', 'ecu'],
-            'label': 'Engine/Powerplant System'
-        },
-        'electrical': {
-            'triggers': ['generator', 'battery', 'bus', 'power loss', 'electrical', 'voltage',
-                         'breaker', 'tripped', 'no power'],
-            'required': ['generator', 'battery', 'bus', 'contactor', 'breaker', 'relay',
-                         'transformer', 'rectifier', 'inverter', 'gcr', 'gcb', 'btb'],
-            'label': 'Electrical Power System'
-        },
-        'flight_controls': {
-            'triggers': ['cyclic', 'collective', 'pedal', 'yaw', 'pitch', 'roll',
-                         'autopilot', 'trim', 'stick', 'vibration'],
-            'required': ['servo', 'actuator', 'swashplate', 'pitch link', 'mixing unit',
-                         'trim', 'boost', 'feel spring', 'gradient unit', 'autopilot'],
-            'label': 'Flight Control System'
-        },
-        'rotor': {
-            'triggers': ['rotor', 'blade', 'hub', 'mast', 'tail rotor', 'main rotor',
-                         'track', 'balance', 'vibration', 'lead-lag'],
-            'required': ['rotor', 'blade', 'hub', 'damper', 'bearing', 'pitch horn',
-                         'lead-lag', 'drag brace', 'elastomeric', 'spindle'],
-            'label': 'Rotor System'
-        },
-        'avionics': {
-            'triggers': ['display', 'screen', 'cas', 'warning', 'caution', 'advisory',
-                         'radio', 'nav', 'gps', 'transponder', 'ahrs', 'adc'],
-            'required': ['display', 'processor', 'symbol generator', 'dmu', 'dcu',
-                         'sensor', 'computer', 'bus', 'arinc', 'can bus'],
-            'label': 'Avionics System'
-        },
-        'fuel': {
-            'triggers': ['fuel', 'tank', 'boost pump', 'transfer', 'crossfeed', 'quantity'],
-            'required': ['fuel pump', 'fuel tank', 'fuel valve', 'boost pump', 'transfer pump',
-                         'crossfeed', 'fuel quantity', 'fuel filter', 'fuel line'],
-            'label': 'Fuel System'
-        },
-    }
-    
     inferred_subsystems = []
     missing_subsystem_analysis = []
     
-    for subsys_name, subsys_data in subsystem_map.items():
-        query_matches = any(trigger in query_lower for trigger in subsys_data['triggers'])
-        if query_matches:
+    query_terms = _find_substrings(_QUERY_TERM_SCANNER, query_lower)
+    fired_subsystems = {
+        subsys for term in query_terms
+        for subsys in _TRIGGER_TO_SUBSYS.get(term, ())
+    }
+    
+    for subsys_name, subsys_data in _SUBSYSTEM_MAP.items():
+        if subsys_name in fired_subsystems:
+            # Per-term `in` checks stop at the first hit and only run for fired
+            # subsystems; a one-pass scanner over every required term is far slower
             diagnosis_has_subsystem = any(req in diagnosis_lower for req in subsys_data['required'])
             inferred_subsystems.append(subsys_data['label'])
             if not diagnosis_has_subsystem:
@@ -892,16 +1516,12 @@ def calculate_certainty_score(
                 alignment_details.append(f"CRITICAL: Query implies {subsys_data['label']} but diagnosis does NOT analyze it")
     
     # --- KEYWORD OVERLAP CHECK ---
-    query_clean = re.sub(r'\[.*?\]', '', query_lower)
-    query_clean = re.sub(r'ata\s*\d+', '', query_clean)
-    query_clean = re.sub(r'aw139|s/n:?\s*\d+', '', query_clean)
+    query_clean = query_lower
+    for pattern in _QUERY_NOISE_RES:
+        query_clean = pattern.sub('', query_clean)
     
-    important_words = re.findall(r'\b[a-z]{4,}\b', query_clean)
-    stop_words = {'does', 'have', 'been', 'with', 'that', 'this', 'from', 'what',
-                  'when', 'where', 'which', 'there', 'their', 'about', 'would',
-                  'could', 'should', 'during', 'before', 'after', 'helicopter',
-                  'aircraft', 'system', 'problem', 'issue', 'fault', 'check'}
-    query_keywords = {w for w in important_words if w not in stop_words and len(w) >= 4}
+    important_words = _QUERY_WORD_RE.findall(query_clean)
+    query_keywords = {w for w in important_words if w not in _QUERY_STOP_WORDS and len(w) >= 4}
     
     if query_keywords:
         matched_keywords = sum(1 for kw in query_keywords if kw in diagnosis_lower)
@@ -927,10 +1547,7 @@ def calculate_certainty_score(
         alignment_details.append(f"Subsystem verified: {', '.join(inferred_subsystems)} analyzed in diagnosis")
     
     # --- GENERIC DIAGNOSIS PENALTY ---
-    is_generic_diagnosis = bool(re.search(
-        r'(?:check continuity|verify wiring|inspect connector|check hydraulic)',
-        diagnosis_lower
-    )) and not has_specific_component and not has_mechanism_explanation
+    is_generic_diagnosis = any(phrase in diagnosis_lower for phrase in _GENERIC_CHECK_PHRASES) and not has_specific_component and not has_mechanism_explanation
     
     if is_generic_diagnosis:
         alignment_score = min(alignment_score, 35)
@@ -938,21 +1555,22 @@ def calculate_certainty_score(
     
     # --- ELECTRICAL MISMATCH PENALTY ---
     # If diagnosis suggests electrical checks but query implies mechanical problem
-    diagnosis_suggests_electrical = any(term in diagnosis_lower for term in 
-        ['continuity', 'wiring', 'circuit', 'resistance', 'voltage'])
-    query_implies_mechanical = any(trigger in query_lower for trigger in 
-        ['turn', 'steering', 'gear', 'stuck', 'binding', 'seized', 'jam', 'stiff',
-         'vibration', 'noise', 'grind', 'click', 'play', 'loose', 'worn'])
+    # Cheapest tests first: the diagnosis scan only runs when the rest holds
+    electrical_checks_for_mechanical = (
+        not has_mechanism_explanation and
+        not query_terms.isdisjoint(_MECHANICAL_QUERY_TRIGGERS) and
+        any(term in diagnosis_lower for term in _ELECTRICAL_CHECK_TERMS)
+    )
     
-    if diagnosis_suggests_electrical and query_implies_mechanical and not has_mechanism_explanation:
+    if electrical_checks_for_mechanical:
         alignment_score = min(alignment_score, 40)
         alignment_details.append("PENALTY: Diagnosis suggests electrical checks for likely mechanical problem without analyzing mechanism")
     
-    print(f"[CrewAI] Query Alignment Score: {alignment_score}% - {alignment_details}")
+    logger.debug("[CrewAI] Query Alignment Score: %s%% - %s", alignment_score, alignment_details)
     if inferred_subsystems:
-        print(f"[CrewAI] Inferred subsystems: {inferred_subsystems}")
+        logger.debug("[CrewAI] Inferred subsystems: %s", inferred_subsystems)
     if missing_subsystem_analysis:
-        print(f"[CrewAI] MISSING subsystem analysis: {missing_subsystem_analysis}")
+        logger.debug("[CrewAI] MISSING subsystem analysis: %s", missing_subsystem_analysis)
     
     # =========================================================================
     # 5. DIAGRAM/SCHEMATIC ANALYSIS SCORE (0-100%) - Weight: 10%
@@ -990,7 +1608,7 @@ def calculate_certainty_score(
             diagram_score = 50
             diagram_details.append("No specific manual references")
     
-    print(f"[CrewAI] Diagram Analysis Score: {diagram_score}% - {diagram_details}")
+    logger.debug("[CrewAI] Diagram Analysis Score: %s%% - %s", diagram_score, diagram_details)
     
     # =========================================================================
     # FINAL SCORE CALCULATION
@@ -1003,23 +1621,22 @@ def calculate_certainty_score(
         (diagram_score * 0.10)
     )
     
-    print(f"[CrewAI] === SCORE BREAKDOWN v3.2 (Type: {'PROCEDURE' if is_procedure_type else 'FAULT_ISOLATION'}) ===")
-    print(f"[CrewAI] Coverage:         {coverage_score:3}% x 0.25 = {coverage_score * 0.25:.1f}")
-    print(f"[CrewAI] System Analysis:  {system_analysis_score:3}% x 0.25 = {system_analysis_score * 0.25:.1f}")
-    print(f"[CrewAI] Evidence:         {evidence_score:3}% x 0.20 = {evidence_score * 0.20:.1f}")
-    print(f"[CrewAI] Query Alignment:  {alignment_score:3}% x 0.20 = {alignment_score * 0.20:.1f}")
-    print(f"[CrewAI] Diagram Analysis: {diagram_score:3}% x 0.10 = {diagram_score * 0.10:.1f}")
-    print(f"[CrewAI] Raw Total: {final_score:.1f}%")
+    logger.debug("[CrewAI] === SCORE BREAKDOWN v3.2 (Type: %s) ===",
+                 'PROCEDURE' if is_procedure_type else 'FAULT_ISOLATION')
+    logger.debug("[CrewAI] Coverage:         %3d%% x 0.25 = %.1f", coverage_score, coverage_score * 0.25)
+    logger.debug("[CrewAI] System Analysis:  %3d%% x 0.25 = %.1f", system_analysis_score, system_analysis_score * 0.25)
+    logger.debug("[CrewAI] Evidence:         %3d%% x 0.20 = %.1f", evidence_score, evidence_score * 0.20)
+    logger.debug("[CrewAI] Query Alignment:  %3d%% x 0.20 = %.1f", alignment_score, alignment_score * 0.20)
+    logger.debug("[CrewAI] Diagram Analysis: %3d%% x 0.10 = %.1f", diagram_score, diagram_score * 0.10)
+    logger.debug("[CrewAI] Raw Total: %.1f%%", final_score)
     
     # =========================================================================
     # HARD CAPS - Different rules for FAULT ISOLATION vs PROCEDURES
     # =========================================================================
     caps_applied = []
     
-    # Pre-compute deep analysis flag for use in hard caps AND 95% threshold
-    has_deep_analysis = (has_probability_ranking and has_signal_path_analysis) or \
-                       (has_system_operation_analysis and has_probability_ranking) or \
-                       (has_signal_path_analysis and has_mechanism_explanation)
+    # Fault isolation without any wiring/AWDP evidence (hard caps AND 95% threshold)
+    fault_without_awdp = is_fault_type and not has_awdp and not has_awdp_ref
     
     if is_procedure_type:
         # --- PROCEDURE HARD CAPS ---
@@ -1035,11 +1652,12 @@ def calculate_certainty_score(
             if final_score > 82:
                 final_score = 82
                 caps_applied.append("CAP 82%: Procedure without steps or component identification")
-    else:
+    elif final_score > 75:
         # --- FAULT ISOLATION HARD CAPS ---
         # Deep system analysis (probability ranking + signal path + system operation) can relax some caps
+        # None of these caps is below 75%, so a score at or under it is left as is
         
-        if is_fault_type and not has_awdp and not has_awdp_ref and not has_deep_analysis:
+        if fault_without_awdp and not has_deep_analysis:
             if final_score > 85:
                 final_score = 85
                 caps_applied.append("CAP 85%: Fault isolation without AWDP/wiring analysis or deep system analysis")
@@ -1069,7 +1687,7 @@ def calculate_certainty_score(
                 final_score = 75
                 caps_applied.append(f"CAP 75%: Diagnosis does not analyze required subsystem: {', '.join(missing_subsystem_analysis)}")
         
-        if diagnosis_suggests_electrical and query_implies_mechanical and not has_mechanism_explanation:
+        if electrical_checks_for_mechanical:
             if final_score > 78:
                 final_score = 78
                 caps_applied.append("CAP 78%: Electrical checks for mechanical problem without mechanism analysis")
@@ -1100,7 +1718,7 @@ def calculate_certainty_score(
             has_specific_component and
             has_causal_reasoning and
             not missing_subsystem_analysis and
-            (not is_fault_type or has_awdp or has_awdp_ref) and
+            not fault_without_awdp and
             (has_amp_ref or has_real_dmc or has_awdp_ref)
         )
         deep_analysis_criteria = (
@@ -1117,46 +1735,47 @@ def calculate_certainty_score(
     if final_score >= 95 and not can_exceed_95:
         final_score = 94
         caps_applied.append("CAP 94%: Does not meet ALL strict criteria for SAFE_TO_PROCEED")
-        missing = []
-        if is_procedure_type:
-            if coverage_score < 80:
-                missing.append(f"Coverage {coverage_score}<80")
-            if system_analysis_score < 60:
-                missing.append(f"SystemAnalysis {system_analysis_score}<60")
-            if not has_amp_ref and not has_real_dmc and not has_ietp_dmc_code:
-                missing.append("NoIETP/DMC/AMP reference")
-            if not has_procedure_steps and not has_specific_component:
-                missing.append("NoProcedureSteps")
-            if alignment_score < 50:
-                missing.append(f"Alignment {alignment_score}<50")
-        else:
-            if system_analysis_score < 75:
-                missing.append(f"SystemAnalysis {system_analysis_score}<75")
-            if coverage_score < 85:
-                missing.append(f"Coverage {coverage_score}<85")
-            if evidence_count < 5:
-                missing.append(f"Evidence {evidence_count}<5")
-            if alignment_score < 70:
-                missing.append(f"Alignment {alignment_score}<70")
-            if not has_specific_component:
-                missing.append("NoSpecificComponent")
-            if not has_causal_reasoning:
-                missing.append("NoCausalReasoning")
-            if is_fault_type and not has_awdp and not has_awdp_ref:
-                missing.append("NoAWDP")
-            if not has_amp_ref and not has_real_dmc and not has_awdp_ref:
-                missing.append("NoManualRef")
-            if missing_subsystem_analysis:
-                missing.append(f"MissingSubsystem({', '.join(missing_subsystem_analysis)})")
-        print(f"[CrewAI] 95% BLOCKED - Missing: {', '.join(missing)}")
-    
-    if caps_applied:
-        for cap in caps_applied:
-            print(f"[CrewAI] {cap}")
+        # The unmet criteria are only reported in the debug trace
+        if logger.isEnabledFor(logging.DEBUG):
+            missing = []
+            if is_procedure_type:
+                if coverage_score < 80:
+                    missing.append(f"Coverage {coverage_score}<80")
+                if system_analysis_score < 60:
+                    missing.append(f"SystemAnalysis {system_analysis_score}<60")
+                if not has_amp_ref and not has_real_dmc and not has_ietp_dmc_code:
+                    missing.append("NoIETP/DMC/AMP reference")
+                if not has_procedure_steps and not has_specific_component:
+                    missing.append("NoProcedureSteps")
+                if alignment_score < 50:
+                    missing.append(f"Alignment {alignment_score}<50")
+            else:
+                if system_analysis_score < 75:
+                    missing.append(f"SystemAnalysis {system_analysis_score}<75")
+                if coverage_score < 85:
+                    missing.append(f"Coverage {coverage_score}<85")
+                if evidence_count < 5:
+                    missing.append(f"Evidence {evidence_count}<5")
+                if alignment_score < 70:
+                    missing.append(f"Alignment {alignment_score}<70")
+                if not has_specific_component:
+                    missing.append("NoSpecificComponent")
+                if not has_causal_reasoning:
+                    missing.append("NoCausalReasoning")
+                if fault_without_awdp:
+                    missing.append("NoAWDP")
+                if not has_amp_ref and not has_real_dmc and not has_awdp_ref:
+                    missing.append("NoManualRef")
+                if missing_subsystem_analysis:
+                    missing.append(f"MissingSubsystem({', '.join(missing_subsystem_analysis)})")
+            logger.debug("[CrewAI] 95%% BLOCKED - Missing: %s", ', '.join(missing))
+    
+    for cap in caps_applied:
+        logger.debug("[CrewAI] %s", cap)
     
     final_score = max(40, min(round(final_score), 100))
     
-    print(f"[CrewAI] === FINAL CERTAINTY SCORE: {final_score}% ===")
+    logger.debug("[CrewAI] === FINAL CERTAINTY SCORE: %s%% ===", final_score)
     
     return {
         "score": final_score,
@@ -1176,28 +1795,24 @@ def calculate_certainty_score(
         "has_ietp_dmc_code": has_ietp_dmc_code
     }
 
+_WHITESPACE_RE = re.compile(r'\s+')
+_SENTENCE_BREAK_RE = re.compile(r'(?<=[.!?])\s+')
+
 def format_diagnosis_text(rag_result: Dict[str, Any], query: str) -> str:
     """Format RAG result into professional diagnostic text."""
     answer = rag_result.get("answer", "")
     docs = rag_result.get("documents") or rag_result.get("chunks") or []
     
     if not answer and not docs:
-        return f"Unable to retrieve documentation for query: {query}. Please verify RAG system connectivity."
+        return f"{_NO_RAG_CONTENT_PREFIX}{query}. Please verify RAG system connectivity."
     
     paragraphs = []
     
     if answer:
-        clean_answer = re.sub(r'\s+', ' ', answer).strip()
-        sentences = re.split(r'(?<=[.!?])\s+', clean_answer)
-        
-        current_para = []
-        for sentence in sentences:
-            current_para.append(sentence)
-            if len(current_para) >= 3:
-                paragraphs.append(" ".join(current_para))
-                current_para = []
-        if current_para:
-            paragraphs.append(" ".join(current_para))
+        clean_answer = _WHITESPACE_RE.sub(' ', answer).strip()
+        sentences = _SENTENCE_BREAK_RE.split(clean_answer)
+        # Three sentences per paragraph, the last one possibly shorter
+        paragraphs.extend(" ".join(sentences[i:i + 3]) for i in range(0, len(sentences), 3))
     
     if docs:
         doc_summary = []
@@ -1217,10 +1832,28 @@ def format_diagnosis_text(rag_result: Dict[str, Any], query: str) -> str:
 # API ENDPOINTS
 # ======================================================================
 
+@app.on_event("startup")
+async def startup_event():
+    """Open the shared RAG HTTP client and concurrency limit."""
+    get_rag_client()
+    get_rag_semaphore()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Close the shared RAG HTTP client and, if it was started, the CrewAI pool."""
+    global rag_client, rag_semaphore, crew_executor
+    if rag_client is not None:
+        await rag_client.aclose()
+        rag_client = None
+    rag_semaphore = None
+    if crew_executor is not None:
+        crew_executor.shutdown(wait=False, cancel_futures=True)
+        crew_executor = None
+
 @app.get("/health", response_model=HealthResponse)
-def health_check():
+async def health_check():
     """Health check endpoint."""
-    rag_ok = check_rag_health()
+    rag_ok = await check_rag_health()
     return HealthResponse(
         status="healthy" if rag_ok else "degraded",
         rag_connected=rag_ok,
@@ -1229,21 +1862,158 @@ def health_check():
     )
 
 @app.post("/diagnose", response_model=DiagnoseResponse)
-def diagnose(request: DiagnoseRequest):
+async def diagnose(request: DiagnoseRequest):
     """Run 3-Agent RAG-based diagnostic analysis with task-type logic."""
+    response = await run_diagnosis(request, RequestCache())
+    return Response(content=_RESP_ADAPTER.dump_json(response), media_type="application/json")
+
+# The body is read raw (see _BATCH_ADAPTER), so its schema is declared here
+# for /docs and generated clients
+@app.post(
+    "/diagnose_batch",
+    response_model=BatchDiagnoseResponse,
+    openapi_extra={"requestBody": {
+        "required": True,
+        "content": {"application/json": {"schema": {"$ref": "#/components/schemas/BatchDiagnoseRequest"}}},
+    }},
+)
+async def diagnose_batch(http_request: Request):
+    """Run several diagnostic requests concurrently, sharing their RAG lookups.
+    
+    Body: {"items": [DiagnoseRequest, ...]}
+    """
+    start_time = time.time()
+    try:
+        batch = _BATCH_ADAPTER.validate_json(await http_request.body())
+    except ValidationError as e:
+        raise RequestValidationError([
+            {**error, "loc": ("body", *error["loc"])} for error in e.errors(include_url=False)
+        ])
+    logger.info("[CrewAI] Batch diagnostic request: %d items", len(batch.items))
+    
+    # Items for the same ATA chapter issue identical AWDP searches, so one
+    # cache across the batch turns those into a single RAG call
+    rag_cache = RequestCache()
+    semaphore = asyncio.Semaphore(BATCH_MAX_CONCURRENCY)
+    
+    async def run_item(item: DiagnoseRequest) -> DiagnoseResponse:
+        async with semaphore:
+            return await run_diagnosis(item, rag_cache)
+    
+    outcomes = await asyncio.gather(*(run_item(item) for item in batch.items), return_exceptions=True)
+    
+    results: List[Optional[DiagnoseResponse]] = []
+    errors: List[BatchItemError] = []
+    for index, outcome in enumerate(outcomes):
+        if isinstance(outcome, HTTPException):
+            results.append(None)
+            errors.append(BatchItemError(index=index, status_code=outcome.status_code, detail=str(outcome.detail)))
+        elif isinstance(outcome, Exception):
+            results.append(None)
+            errors.append(BatchItemError(index=index, status_code=500, detail=str(outcome)))
+        elif isinstance(outcome, BaseException):
+            raise outcome
+        else:
+            results.append(outcome)
+    
+    response = BatchDiagnoseResponse(
+        results=results,
+        errors=errors,
+        processing_time_ms=round((time.time() - start_time) * 1000, 2)
+    )
+    return Response(content=_BATCH_RESP_ADAPTER.dump_json(response), media_type="application/json")
+
+_default_openapi = app.openapi
+
+def _openapi_with_batch_request() -> Dict[str, Any]:
+    """FastAPI's OpenAPI schema plus the BatchDiagnoseRequest component /diagnose_batch refers to."""
+    if app.openapi_schema is None:
+        schema = _default_openapi()
+        components = schema["components"]["schemas"]
+        batch_schema = BatchDiagnoseRequest.model_json_schema(ref_template="#/components/schemas/{model}")
+        for name, definition in batch_schema.pop("$defs", {}).items():
+            components.setdefault(name, definition)
+        components["BatchDiagnoseRequest"] = batch_schema
+    return app.openapi_schema
+
+app.openapi = _openapi_with_batch_request
+
+@app.get("/diagnose_stream")
+async def diagnose_stream(request: DiagnoseRequest = Depends()):
+    """Stream diagnostic sections as Server-Sent Events while the agents run."""
+    events: asyncio.Queue = asyncio.Queue()
+    
+    async def emit(section: str, data: Any) -> None:
+        events.put_nowait(("partial", {"section": section, "data": data}))
+        # Let the stream flush this section before the next stage runs
+        await asyncio.sleep(0)
+    
+    async def run() -> None:
+        try:
+            response = await run_diagnosis(request, RequestCache(), emit)
+            events.put_nowait(("complete", response.model_dump(mode="json")))
+        except HTTPException as e:
+            events.put_nowait(("error", {"status_code": e.status_code, "detail": e.detail}))
+        except Exception as e:
+            events.put_nowait(("error", {"status_code": 500, "detail": str(e)}))
+        finally:
+            events.put_nowait(None)
+    
+    async def event_stream():
+        task = asyncio.create_task(run())
+        try:
+            yield "event: started\ndata: {}\n\n"
+            while (item := await events.get()) is not None:
+                event, data = item
+                yield f"event: {event}\ndata: {orjson.dumps(data).decode()}\n\n"
+        finally:
+            # Client went away mid-diagnosis
+            task.cancel()
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+async def run_diagnosis(
+    request: DiagnoseRequest,
+    rag_cache: RequestCache,
+    emit: Optional[DiagnosisEmitter] = None
+) -> DiagnoseResponse:
+    """Serve a diagnostic request from the response caches or run the 3-Agent system."""
     start_time = time.time()
     
-    print(f"\n{'='*60}")
-    print(f"[CrewAI] New diagnostic request")
-    print(f"[CrewAI] Query: {request.query}")
-    print(f"[CrewAI] S/N: {request.serial_number}")
-    print(f"[CrewAI] ATA/Training: {request.ata_code}")
-    print(f"[CrewAI] Task Type: {request.task_type}")
-    print(f"[CrewAI] Configuration: {request.aircraft_configuration or 'Unknown'} ({request.configuration_name or 'N/A'})")
-    print(f"{'='*60}\n")
+    logger.info("[CrewAI] New diagnostic request")
+    logger.info("[CrewAI] Query: %s", request.query)
+    logger.info("[CrewAI] S/N: %s", request.serial_number)
+    logger.info("[CrewAI] ATA/Training: %s", request.ata_code)
+    logger.info("[CrewAI] Task Type: %s", request.task_type)
+    logger.info(
+        "[CrewAI] Configuration: %s (%s)",
+        request.aircraft_configuration or "Unknown", request.configuration_name or "N/A"
+    )
+    
+    cache_key = response_cache_key(request)
+    cached = response_cache.get(cache_key)
+    if cached is not None:
+        logger.info("[CrewAI] Response cache hit")
+        return cached.model_copy(update={"processing_time_ms": round((time.time() - start_time) * 1000, 2)})
+    
+    if SEMANTIC_CACHE_SIZE > 0:
+        context = semantic_cache_context(request)
+        embedding = embed_query(request.query)
+        similar = semantic_cache.get(context, embedding)
+        if similar is not None:
+            # The response keeps the query it was diagnosed for
+            logger.info("[CrewAI] Semantic cache hit: %.60s", similar.query)
+            return similar.model_copy(update={"processing_time_ms": round((time.time() - start_time) * 1000, 2)})
     
     # Use 3-Agent RAG system for fast and reliable responses
-    return run_three_agent_diagnosis(request, start_time)
+    response, rag_complete = await run_three_agent_diagnosis(request, start_time, rag_cache, emit)
+    # A diagnosis built around a failed supplementary lookup is returned but
+    # not cached, so the next identical request retries the RAG
+    if rag_complete:
+        response_cache.set(cache_key, response)
+        if SEMANTIC_CACHE_SIZE > 0:
+            semantic_cache.set(context, embedding, response)
+    return response
 
 # ======================================================================
 # TASK TYPE CONFIGURATION
@@ -1264,10 +2034,19 @@ TASK_TYPE_LABELS = {
     "other": "Maintenance Task"
 }
 
-def get_task_type_instructions(task_type: str) -> str:
-    """Return specific instructions based on task type."""
-    instructions = {
-        "fault_isolation": """
+# Task types diagnosed from symptoms (likely causes, AWDP system analysis)
+FAULT_TASK_TYPES = frozenset({TaskType.FAULT_ISOLATION, TaskType.OPERATIONAL_TEST, TaskType.FUNCTIONAL_TEST})
+REMOVE_INSTALL_TASK_TYPES = frozenset({TaskType.REMOVE_PROCEDURE, TaskType.INSTALL_PROCEDURE})
+# Task types scored on steps/tools/references instead of causal analysis
+# ("rigging_procedure" predates TaskType and is still honored by the scorer)
+PROCEDURE_TASK_TYPES = frozenset({
+    TaskType.REMOVE_PROCEDURE, TaskType.INSTALL_PROCEDURE, TaskType.DISASSEMBLY, TaskType.ASSEMBLY,
+    TaskType.ADJUSTMENT, "rigging_procedure", TaskType.BONDING_CHECK, TaskType.DETAILED_INSPECTION,
+    TaskType.SYSTEM_DESCRIPTION,
+})
+
+TASK_TYPE_INSTRUCTIONS = {
+    "fault_isolation": """
 TASK TYPE: FAULT ISOLATION - DEEP SYSTEM ANALYSIS REQUIRED
 
 CRITICAL INSTRUCTION: If the exact problem described by the mechanic is NOT explicitly documented as a procedure in the manual, you MUST perform DEEP SYSTEM ANALYSIS:
@@ -1301,7 +2080,7 @@ STEP 4 - MANDATORY OUTPUTS:
 
 PHILOSOPHY: Even when the exact fault is not written in the manual, if you understand how the system works, you can deduce what could cause the problem. A good mechanic does this naturally - the AI must do the same by analyzing the system documentation.
 """,
-        "functional_test": """
+    "functional_test": """
 TASK TYPE: FUNCTIONAL TEST
 You must:
 - Provide step-by-step testing procedure from AMP
@@ -1311,7 +2090,7 @@ You must:
 - Reference AWDP wiring data for any electrical connections being tested
 - If the exact test procedure is not in the manual, analyze the AWDP diagram to understand the system and propose a logical test sequence based on signal flow
 """,
-        "operational_test": """
+    "operational_test": """
 TASK TYPE: OPERATIONAL TEST
 You must:
 - Provide operational verification steps from AMP
@@ -1322,7 +2101,7 @@ You must:
 - Reference connector pin-outs and wiring from AWDP
 - If the exact test is not documented, analyze the system architecture to propose verification steps based on component function
 """,
-        "remove_procedure": """
+    "remove_procedure": """
 TASK TYPE: REMOVE PROCEDURE
 You must:
 - Provide step-by-step removal procedure from AMP
@@ -1331,7 +2110,7 @@ You must:
 - List tools and support equipment from Table 3
 - Include safety precautions
 """,
-        "install_procedure": """
+    "install_procedure": """
 TASK TYPE: INSTALL PROCEDURE
 You must:
 - Provide step-by-step installation procedure from AMP
@@ -1340,7 +2119,7 @@ You must:
 - List tools and support equipment from Table 3
 - Include safety precautions
 """,
-        "system_description": """
+    "system_description": """
 TASK TYPE: SYSTEM DESCRIPTION
 You must:
 - Explain how the system works technically based on AMP and AWDP documentation
@@ -1350,7 +2129,7 @@ You must:
 - Identify all components in the functional chain
 - Do NOT provide troubleshooting steps
 """,
-        "adjustment": """
+    "adjustment": """
 TASK TYPE: ADJUSTMENT / CALIBRATION
 You must:
 - Provide exact adjustment procedure from manual
@@ -1359,7 +2138,7 @@ You must:
 - Include warmup time requirements
 - Reference calibration tools required
 """,
-        "detailed_inspection": """
+    "detailed_inspection": """
 TASK TYPE: DETAILED INSPECTION
 You must:
 - Provide inspection criteria and limits
@@ -1367,31 +2146,68 @@ You must:
 - Reference acceptance/rejection criteria
 - Specify measurement methods if applicable
 """,
-    }
-    return instructions.get(task_type, instructions["fault_isolation"])
+}
+
+def get_task_type_instructions(task_type: str) -> str:
+    """Return specific instructions based on task type."""
+    return TASK_TYPE_INSTRUCTIONS.get(task_type, TASK_TYPE_INSTRUCTIONS["fault_isolation"])
+
+
+# AWDP document patterns - multiple formats
+# Format 1: 30-A-XX-XX-XX-XXX-XXXA-A (wiring diagrams)
+# Format 2: 39-A-AWDP-XX-XXX (legacy format)
+# Format 3: Any reference to wiring/schematic data
+_LEGACY_AWDP_RE = re.compile(r'39-[A-Z]-AWDP-\d{2}-[A-Z0-9X-]+', re.IGNORECASE)
+_WIRING_DMC_RE = re.compile(r'\d{2}-[A-Z]-\d{2}-\d{2}-\d{2}-\d{2}[A-Z]-\d{3}[A-Z]-[A-Z]', re.IGNORECASE)
 
+def _find_awdp_refs(text: str, text_lower: str) -> List[str]:
+    """AWDP references in format order (wiring diagram, legacy, generic DMC wiring).
+    
+    A format 1 code can only start where a format 3 match starts, so the
+    format 1 matches are the "30-" subset of a single format 3 scan.
+    """
+    dmc_matches = _WIRING_DMC_RE.findall(text)
+    refs = [m for m in dmc_matches if m.startswith("30")]
+    if "awdp" in text_lower:
+        refs.extend(_LEGACY_AWDP_RE.findall(text))
+    refs.extend(dmc_matches)
+    return refs
 
-def run_three_agent_diagnosis(request: DiagnoseRequest, start_time: float) -> DiagnoseResponse:
+_DMC_PREFIX_RE = re.compile(r'\d{2}-[A-Z]-\d{2}-\d{2}', re.IGNORECASE)
+_NUMBERED_STEP_RE = re.compile(r'^\s*\d+\.', re.MULTILINE)
+_AWDP_DOC_INDICATORS = ("awdp", "wiring data", "wiring diagram", "schematic", "circuit diagram", "electrical diagram")
+_AWDP_DIAGNOSIS_TERMS = ('awdp', 'wiring diagram', 'schematic', 'circuit diagram')
+_WIRING_DOC_TERMS = ('wiring', 'schematic', 'circuit', 'diagram', 'connector', 'pin')
+
+async def run_three_agent_diagnosis(
+    request: DiagnoseRequest,
+    start_time: float,
+    rag_cache: Optional[RequestCache] = None,
+    emit: Optional[DiagnosisEmitter] = None
+) -> Tuple[DiagnoseResponse, bool]:
     """Run 3-Agent diagnostic system with task-type awareness.
     
     3-Agent System:
     1. Primary Diagnostic Agent - Generates initial diagnosis
     2. Cross-Check Agent - Validates and verifies diagnosis
     3. Historical/Inventory Agent - Adds historical context
+    
+    Returns the response and whether every AWDP lookup succeeded.
     """
-    task_type = request.task_type or "fault_isolation"
-    task_label = TASK_TYPE_LABELS.get(task_type, "Fault Isolation")
+    rag_cache = rag_cache or RequestCache()
+    task_type = request.task_type
+    task_label = TASK_TYPE_LABELS[task_type]
     
     # Get aircraft configuration for filtering
-    config_code = request.aircraft_configuration or ""
+    config_code = request.aircraft_configuration
     config_name = request.configuration_name or ""
     config_context = f" [{config_code} - {config_name}]" if config_code else ""
     
-    is_fault_type = task_type in ["fault_isolation", "operational_test", "functional_test"]
+    is_fault_type = task_type in FAULT_TASK_TYPES
     
-    print(f"[Agent-1] PRIMARY DIAGNOSTIC AGENT starting...")
-    print(f"[Agent-1] Task Type: {task_label}")
-    print(f"[Agent-1] Aircraft Config: {config_code or 'Unknown'} ({config_name or 'N/A'})")
+    logger.info("[Agent-1] PRIMARY DIAGNOSTIC AGENT starting...")
+    logger.info("[Agent-1] Task Type: %s", task_label)
+    logger.info("[Agent-1] Aircraft Config: %s (%s)", config_code or 'Unknown', config_name or 'N/A')
     
     # Get task-type specific instructions for the GPT prompt
     task_instructions = get_task_type_instructions(task_type)
@@ -1418,9 +2234,20 @@ Do NOT simply say "consult the manual" - ANALYZE the system and provide your tec
         else:
             enhanced_query = f"[{task_label}]{config_context} {request.query}"
         
-        rag_result = query_rag(enhanced_query, top_k=10, ata_code=request.ata_code)
+        # The AWDP deep search does not depend on the primary result, so both
+        # lookups run concurrently under the shared RAG limit
+        rag_lookups = [{"query": enhanced_query, "top_k": 10, "ata_code": request.ata_code}]
+        if is_fault_type and request.ata_code:
+            ata_num = request.ata_code.replace("ATA ", "").strip()[:2] if request.ata_code else ""
+            awdp_query = f"AWDP wiring diagram schematic electrical circuit ATA {ata_num} system operation components connectors pins signal path"
+            logger.debug("[Agent-1] AWDP deep search: %.60s...", awdp_query)
+            rag_lookups.append({"query": awdp_query, "top_k": 5, "ata_code": request.ata_code})
+        
+        rag_result, *awdp_results = await query_rag_many(rag_lookups, rag_cache)
+        if isinstance(rag_result, BaseException):
+            raise rag_result
     except Exception as e:
-        print(f"[Agent-1] RAG query exception: {e}")
+        logger.warning("[Agent-1] RAG query exception: %s", e)
         raise HTTPException(status_code=503, detail=f"RAG query failed: {e}")
     
     if "error" in rag_result:
@@ -1429,17 +2256,19 @@ Do NOT simply say "consult the manual" - ANALYZE the system and provide your tec
             detail=f"RAG API not available: {rag_result['error']}"
         )
     
-    # For fault isolation: perform a SECOND RAG query specifically for AWDP/wiring diagrams
+    # For fault isolation: merge the AWDP/wiring diagram results into the primary context
     awdp_rag_docs = []
-    if is_fault_type and request.ata_code:
+    rag_complete = True
+    if awdp_results:
         try:
-            ata_num = request.ata_code.replace("ATA ", "").strip()[:2] if request.ata_code else ""
-            awdp_query = f"AWDP wiring diagram schematic electrical circuit ATA {ata_num} system operation components connectors pins signal path"
-            print(f"[Agent-1] AWDP deep search: {awdp_query[:60]}...")
-            awdp_result = query_rag(awdp_query, top_k=5, ata_code=request.ata_code)
+            awdp_result = awdp_results[0]
+            if isinstance(awdp_result, BaseException):
+                raise awdp_result
+            if "error" in awdp_result:
+                raise RuntimeError(awdp_result["error"])
             awdp_rag_docs = awdp_result.get("documents") or awdp_result.get("chunks") or []
             if awdp_rag_docs:
-                print(f"[Agent-1] AWDP search returned {len(awdp_rag_docs)} additional documents for system analysis")
+                logger.info("[Agent-1] AWDP search returned %d additional documents for system analysis", len(awdp_rag_docs))
                 # Merge AWDP docs into main RAG result (avoid duplicates)
                 existing_paths = set()
                 for doc in (rag_result.get("documents") or rag_result.get("chunks") or []):
@@ -1452,33 +2281,30 @@ Do NOT simply say "consult the manual" - ANALYZE the system and provide your tec
                         elif "chunks" in rag_result:
                             rag_result["chunks"].append(doc)
                         existing_paths.add(doc.get("doc_path", ""))
-                        print(f"[Agent-1] Added AWDP doc: {doc.get('doc_path', 'unknown')[-50:]}")
+                        logger.debug("[Agent-1] Added AWDP doc: %s", doc.get('doc_path', 'unknown')[-50:])
         except Exception as e:
-            print(f"[Agent-1] AWDP deep search failed (non-critical): {e}")
+            rag_complete = False
+            logger.warning("[Agent-1] AWDP deep search failed (non-critical): %s", e)
+    
+    if emit:
+        await emit("retrieval", {"documents": len(rag_result.get("documents") or rag_result.get("chunks") or [])})
     
     # Format diagnosis with task-type specific instructions
     raw_diagnosis = format_diagnosis_text(rag_result, request.query)
     diagnosis_text = clean_markdown_artifacts(raw_diagnosis)
     diagnosis_text = validate_part_numbers(diagnosis_text)
+    diagnosis_text_lower = diagnosis_text.lower()
     
     # Add technical references header (mandatory)
-    ata_chapter = extract_ata_chapter(diagnosis_text) or rag_result.get("ata", request.ata_code)
+    ata_chapter = _scan_ata_chapter(diagnosis_text, diagnosis_text_lower) or rag_result.get("ata", request.ata_code)
     
     # Check for AWDP (wiring diagrams) in RAG documents
     rag_documents = rag_result.get("documents", [])
     has_awdp = False
     awdp_ref = "Not Available"
-    awdp_refs_found = []
-    
-    # AWDP document patterns - multiple formats
-    # Format 1: 30-A-XX-XX-XX-XXX-XXXA-A (wiring diagrams)
-    # Format 2: 39-A-AWDP-XX-XXX (legacy format)
-    # Format 3: Any reference to wiring/schematic data
-    awdp_patterns = [
-        r'30-[A-Z]-\d{2}-\d{2}-\d{2}-\d{2}[A-Z]-\d{3}[A-Z]-[A-Z]',  # AWDP wiring diagram format
-        r'39-[A-Z]-AWDP-\d{2}-[A-Z0-9X-]+',  # Legacy AWDP format
-        r'\d{2}-[A-Z]-\d{2}-\d{2}-\d{2}-\d{2}[A-Z]-\d{3}[A-Z]-[A-Z]',  # Generic DMC wiring
-    ]
+    # Insertion-ordered set; only the first three references are shown, so
+    # reference scans stop once three distinct ones are known
+    awdp_refs_found: Dict[str, None] = {}
     
     for doc in rag_documents:
         doc_text = doc.get("content", "") or doc.get("text", "") or ""
@@ -1487,64 +2313,61 @@ Do NOT simply say "consult the manual" - ANALYZE the system and provide your tec
         combined_lower = combined.lower()
         
         # Check for AWDP indicators
-        awdp_indicators = ["awdp", "wiring data", "wiring diagram", "schematic", "circuit diagram", "electrical diagram"]
-        if any(ind in combined_lower for ind in awdp_indicators):
+        if any(ind in combined_lower for ind in _AWDP_DOC_INDICATORS):
             has_awdp = True
             # Try to extract AWDP reference using multiple patterns
-            for pattern in awdp_patterns:
-                awdp_matches = re.findall(pattern, combined, re.IGNORECASE)
-                awdp_refs_found.extend(awdp_matches)
+            awdp_refs_found.update(dict.fromkeys(_find_awdp_refs(combined, combined_lower)))
             if not awdp_refs_found:
-                awdp_refs_found.append("Referenced in procedure")
-            print(f"[AWDP] Found AWDP indicator in doc: {doc_path[-50:]}")
+                awdp_refs_found["Referenced in procedure"] = None
+            logger.debug("[AWDP] Found AWDP indicator in doc: %s", doc_path[-50:])
+            # Remaining documents could only confirm has_awdp again
+            if len(awdp_refs_found) >= 3:
+                break
     
     # Also check diagnosis text for AWDP references
-    diagnosis_combined = diagnosis_text
-    for pattern in awdp_patterns:
-        diag_matches = re.findall(pattern, diagnosis_combined, re.IGNORECASE)
-        if diag_matches:
-            has_awdp = True
-            awdp_refs_found.extend(diag_matches)
-            print(f"[AWDP] Found AWDP pattern in diagnosis: {diag_matches}")
+    diag_matches = _find_awdp_refs(diagnosis_text, diagnosis_text_lower) if len(awdp_refs_found) < 3 else []
+    if diag_matches:
+        has_awdp = True
+        awdp_refs_found.update(dict.fromkeys(diag_matches))
+        logger.debug("[AWDP] Found AWDP pattern in diagnosis: %s", diag_matches)
     
     # Also check for wiring diagram keywords in diagnosis
     if not has_awdp:
-        diagnosis_lower = diagnosis_text.lower()
-        if any(term in diagnosis_lower for term in ['awdp', 'wiring diagram', 'schematic', 'circuit diagram']):
+        if any(term in diagnosis_text_lower for term in _AWDP_DIAGNOSIS_TERMS):
             has_awdp = True
-            awdp_refs_found.append("Referenced in procedure")
-            print(f"[AWDP] Found AWDP reference in diagnosis text")
+            awdp_refs_found["Referenced in procedure"] = None
+            logger.debug("[AWDP] Found AWDP reference in diagnosis text")
     
     # Set the AWDP reference string
     if awdp_refs_found:
-        unique_refs = list(dict.fromkeys(awdp_refs_found))  # Remove duplicates, preserve order
-        awdp_ref = ", ".join(unique_refs[:3])  # Show up to 3 references
+        awdp_ref = ", ".join(islice(awdp_refs_found, 3))  # Show up to 3 references
     
     # If still no AWDP found, do a specific AWDP search for the ATA with configuration
     if not has_awdp and request.ata_code:
         # Include configuration in AWDP search to get config-specific diagrams
         config_filter = f" {config_code} {config_name}" if config_code else ""
         awdp_query = f"wiring diagram schematic circuit {request.ata_code} AWDP{config_filter}"
-        print(f"[AWDP] Secondary search with config: {awdp_query}")
+        logger.debug("[AWDP] Secondary search with config: %s", awdp_query)
         try:
-            awdp_rag_result = query_rag(awdp_query, top_k=5, ata_code=request.ata_code)
+            awdp_rag_result = await rag_cache.query(awdp_query, top_k=5, ata_code=request.ata_code)
+            if "error" in awdp_rag_result:
+                raise RuntimeError(awdp_rag_result["error"])
             awdp_docs = awdp_rag_result.get("documents", [])
             for doc in awdp_docs:
                 doc_text = doc.get("content", "") or doc.get("text", "") or ""
                 doc_lower = doc_text.lower()
-                if any(term in doc_lower for term in ['wiring', 'schematic', 'circuit', 'diagram', 'connector', 'pin']):
+                if any(term in doc_lower for term in _WIRING_DOC_TERMS):
                     has_awdp = True
-                    for pattern in awdp_patterns:
-                        matches = re.findall(pattern, doc_text, re.IGNORECASE)
-                        if matches:
-                            awdp_ref = matches[0]
-                            print(f"[AWDP] Found via secondary search: {awdp_ref}")
-                            break
+                    matches = _find_awdp_refs(doc_text, doc_lower)
+                    if matches:
+                        awdp_ref = matches[0]
+                        logger.debug("[AWDP] Found via secondary search: %s", awdp_ref)
                     if awdp_ref == "Not Available":
                         awdp_ref = "See wiring data in referenced documents"
                     break
         except Exception as e:
-            print(f"[AWDP] Secondary search failed: {e}")
+            rag_complete = False
+            logger.warning("[AWDP] Secondary search failed: %s", e)
     
     # Build configuration line for header
     config_line = ""
@@ -1559,13 +2382,12 @@ AWDP: {awdp_ref}
 """
     
     # AGENT 2: Cross-Check & Verification Agent
-    print(f"[Agent-2] CROSS-CHECK AGENT validating diagnosis...")
+    logger.info("[Agent-2] CROSS-CHECK AGENT validating diagnosis...")
     
     # Verify diagnosis has required components
     verification_notes = []
-    has_dmc_ref = bool(re.search(r'\d{2}-[A-Z]-\d{2}-\d{2}', diagnosis_text, re.IGNORECASE))
-    has_procedure_steps = bool(re.search(r'^\s*\d+\.', diagnosis_text, re.MULTILINE))
-    has_safety_note = any(word in diagnosis_text.lower() for word in ['caution', 'warning', 'note:', 'safety'])
+    has_dmc_ref = bool(_DMC_PREFIX_RE.search(diagnosis_text))
+    has_procedure_steps = bool(_NUMBERED_STEP_RE.search(diagnosis_text))
     
     if has_dmc_ref and has_procedure_steps:
         verification_status = "VERIFIED - NO CORRECTIONS"
@@ -1578,10 +2400,10 @@ AWDP: {awdp_ref}
         verification_status = "CRITICAL CORRECTION REQUIRED"
         verification_notes.append("Missing mandatory procedure structure")
     
-    print(f"[Agent-2] Verification status: {verification_status}")
+    logger.info("[Agent-2] Verification status: %s", verification_status)
     
     # AGENT 3: Historical + Inventory Agent
-    print(f"[Agent-3] HISTORICAL + INVENTORY AGENT checking history...")
+    logger.info("[Agent-3] HISTORICAL + INVENTORY AGENT checking history...")
     
     # Check for historical matches (placeholder - would query troubleshooting_history table)
     historical_alert = ""
@@ -1603,56 +2425,46 @@ Cross-Check Status: {verification_status}
     
     # NOTE: Mechanic log template is now handled by frontend as editable fields
     
+    if emit:
+        await emit("diagnosis", {"diagnosis": final_diagnosis, "ata_chapter": ata_chapter})
+    
     # Extract structured data
-    parts_raw = extract_part_numbers(final_diagnosis)
-    affected_parts = [
-        AffectedPart(
-            part_number=p["part_number"],
-            description=p["description"],
-            location=p["location"],
-            action=p["action"]
-        ) for p in parts_raw
-    ]
-    
-    causes_raw = extract_likely_causes(final_diagnosis)
-    likely_causes = [
-        LikelyCause(
-            cause=c["cause"],
-            probability=c["probability"],
-            reasoning=c["reasoning"]
-        ) for c in causes_raw
-    ]
+    final_diagnosis_lower = final_diagnosis.lower()
+    extracted = extract_all(final_diagnosis, final_diagnosis_lower)
+    parts_raw = extracted["parts"]
+    affected_parts = [AffectedPart(**p) for p in parts_raw]
+    
+    causes_raw = extract_likely_causes(final_diagnosis, final_diagnosis_lower)
+    likely_causes = [LikelyCause(**c) for c in causes_raw]
     
     tests_raw = extract_recommended_tests(final_diagnosis, ata_chapter)
-    recommended_tests = [
-        RecommendedTest(
-            step=t["step"],
-            description=t["description"],
-            reference=t["reference"],
-            expected_result=t["expected_result"]
-        ) for t in tests_raw
-    ]
-    
-    references = extract_references(final_diagnosis)
+    recommended_tests = [RecommendedTest(**t) for t in tests_raw]
+    
+    references = extracted["references"]
     if not references and rag_result.get("references"):
         references = rag_result["references"][:10]
     
+    if emit:
+        await emit("affected_parts", [dataclasses.asdict(p) for p in affected_parts])
+        await emit("likely_causes", [dataclasses.asdict(c) for c in likely_causes])
+        await emit("recommended_tests", [dataclasses.asdict(t) for t in recommended_tests])
+        await emit("references", references)
+    
     # Calculate certainty with rigorous v3.0 formula
     certainty_result = calculate_certainty_score(
         rag_result, final_diagnosis, request.query, request.ata_code,
-        task_type=task_type, has_awdp=has_awdp
+        task_type=task_type, has_awdp=has_awdp, diagnosis_lower=final_diagnosis_lower
     )
     certainty_score = certainty_result["score"]
-    certainty_breakdown = certainty_result.get("breakdown", {})
     
     # Apply task-type certainty rules
-    if task_type == "fault_isolation" and not likely_causes:
+    if task_type is TaskType.FAULT_ISOLATION and not likely_causes:
         certainty_score = min(certainty_score, 80)
-        print(f"[Agent-2] Certainty reduced: Fault isolation without likely causes")
+        logger.info("[Agent-2] Certainty reduced: Fault isolation without likely causes")
     
-    if task_type in ["remove_procedure", "install_procedure"] and not has_procedure_steps:
+    if task_type in REMOVE_INSTALL_TASK_TYPES and not has_procedure_steps:
         certainty_score = min(certainty_score, 75)
-        print(f"[Agent-2] Certainty reduced: R&I procedure without steps")
+        logger.info("[Agent-2] Certainty reduced: R&I procedure without steps")
     
     certainty_status = "SAFE_TO_PROCEED" if certainty_score >= CERTAINTY_THRESHOLD else "REQUIRE_EXPERT"
     
@@ -1669,17 +2481,24 @@ Cross-Check Status: {verification_status}
             f"Task type: {task_label}. Expert consultation mandatory before proceeding."
         )
     
+    if emit:
+        await emit("supervisor_notes", {
+            "certainty_score": certainty_score,
+            "certainty_status": certainty_status,
+            "supervisor_notes": supervisor_notes
+        })
+    
     processing_time = (time.time() - start_time) * 1000
     
-    print(f"\n[CrewAI] 3-Agent Diagnosis complete")
-    print(f"[CrewAI] Task Type: {task_label}")
-    print(f"[CrewAI] Certainty: {certainty_score}% - {certainty_status}")
-    print(f"[CrewAI] Parts found: {len(affected_parts)}")
-    print(f"[CrewAI] References: {len(references)}")
-    print(f"[CrewAI] Verification: {verification_status}")
-    print(f"[CrewAI] Processing time: {processing_time:.0f}ms\n")
+    logger.info("[CrewAI] 3-Agent Diagnosis complete")
+    logger.info("[CrewAI] Task Type: %s", task_label)
+    logger.info("[CrewAI] Certainty: %s%% - %s", certainty_score, certainty_status)
+    logger.info("[CrewAI] Parts found: %d", len(affected_parts))
+    logger.info("[CrewAI] References: %d", len(references))
+    logger.info("[CrewAI] Verification: %s", verification_status)
+    logger.info("[CrewAI] Processing time: %.0fms", processing_time)
     
-    return DiagnoseResponse(
+    response = DiagnoseResponse(
         query=request.query,
         serial_number=request.serial_number,
         diagnosis=final_diagnosis,
@@ -1694,16 +2513,25 @@ Cross-Check Status: {verification_status}
         source="3-Agent System (Primary → Cross-Check → Historical)",
         processing_time_ms=round(processing_time, 2)
     )
+    return response, rag_complete
 
-def run_crewai_diagnosis(request: DiagnoseRequest, start_time: float) -> DiagnoseResponse:
+async def run_crewai_diagnosis(
+    request: DiagnoseRequest,
+    start_time: float,
+    rag_cache: Optional[RequestCache] = None
+) -> DiagnoseResponse:
     """Run diagnosis using the full 3-tier CrewAI system."""
+    rag_cache = rag_cache or RequestCache()
     try:
         crew = AW139DiagnosticCrew()
-        crew_result = crew.run_diagnostic(request.query, request.serial_number)
+        # CrewAI is synchronous; keep it off the event loop
+        crew_result = await asyncio.get_running_loop().run_in_executor(
+            get_crew_executor(), crew.run_diagnostic, request.query, request.serial_number
+        )
         
         if not crew_result.get("success", False):
-            print(f"[CrewAI] CrewAI returned error: {crew_result.get('error')}")
-            return run_rag_only_diagnosis(request, start_time)
+            logger.warning("[CrewAI] CrewAI returned error: %s", crew_result.get('error'))
+            return await run_rag_only_diagnosis(request, start_time, rag_cache)
         
         raw_diagnosis = crew_result.get("result", "") or crew_result.get("diagnosis", "")
         diagnosis_text = clean_markdown_artifacts(raw_diagnosis)
@@ -1715,7 +2543,7 @@ def run_crewai_diagnosis(request: DiagnoseRequest, start_time: float) -> Diagnos
         if certainty_score == 0:
             certainty_result = calculate_certainty_score(
                 {"documents": []}, diagnosis_text, request.query, request.ata_code,
-                task_type=request.task_type or "fault_isolation"
+                task_type=request.task_type
             )
             certainty_score = certainty_result["score"]
         
@@ -1737,14 +2565,7 @@ def run_crewai_diagnosis(request: DiagnoseRequest, start_time: float) -> Diagnos
         
         if not affected_parts:
             parts_raw = extract_part_numbers(diagnosis_text)
-            affected_parts = [
-                AffectedPart(
-                    part_number=p["part_number"],
-                    description=p["description"],
-                    location=p["location"],
-                    action=p["action"]
-                ) for p in parts_raw
-            ]
+            affected_parts = [AffectedPart(**p) for p in parts_raw]
         
         causes_data = crew_result.get("likely_causes", [])
         likely_causes = []
@@ -1758,13 +2579,7 @@ def run_crewai_diagnosis(request: DiagnoseRequest, start_time: float) -> Diagnos
         
         if not likely_causes:
             causes_raw = extract_likely_causes(diagnosis_text)
-            likely_causes = [
-                LikelyCause(
-                    cause=c["cause"],
-                    probability=c["probability"],
-                    reasoning=c["reasoning"]
-                ) for c in causes_raw
-            ]
+            likely_causes = [LikelyCause(**c) for c in causes_raw]
         
         tests_data = crew_result.get("recommended_tests", [])
         recommended_tests = []
@@ -1779,14 +2594,7 @@ def run_crewai_diagnosis(request: DiagnoseRequest, start_time: float) -> Diagnos
         
         if not recommended_tests:
             tests_raw = extract_recommended_tests(diagnosis_text, ata_chapter)
-            recommended_tests = [
-                RecommendedTest(
-                    step=t["step"],
-                    description=t["description"],
-                    reference=t["reference"],
-                    expected_result=t["expected_result"]
-                ) for t in tests_raw
-            ]
+            recommended_tests = [RecommendedTest(**t) for t in tests_raw]
         
         references = crew_result.get("references", [])
         if not references:
@@ -1807,11 +2615,11 @@ def run_crewai_diagnosis(request: DiagnoseRequest, start_time: float) -> Diagnos
         
         processing_time = (time.time() - start_time) * 1000
         
-        print(f"\n[CrewAI] 3-Tier Diagnosis complete")
-        print(f"[CrewAI] Certainty: {certainty_score}% - {certainty_status}")
-        print(f"[CrewAI] Parts found: {len(affected_parts)}")
-        print(f"[CrewAI] References: {len(references)}")
-        print(f"[CrewAI] Processing time: {processing_time:.0f}ms\n")
+        logger.info("[CrewAI] 3-Tier Diagnosis complete")
+        logger.info("[CrewAI] Certainty: %s%% - %s", certainty_score, certainty_status)
+        logger.info("[CrewAI] Parts found: %d", len(affected_parts))
+        logger.info("[CrewAI] References: %d", len(references))
+        logger.info("[CrewAI] Processing time: %.0fms", processing_time)
         
         return DiagnoseResponse(
             query=request.query,
@@ -1830,16 +2638,21 @@ def run_crewai_diagnosis(request: DiagnoseRequest, start_time: float) -> Diagnos
         )
         
     except Exception as e:
-        print(f"[CrewAI] CrewAI execution error: {e}")
-        print("[CrewAI] Falling back to RAG-only mode")
-        return run_rag_only_diagnosis(request, start_time)
+        logger.warning("[CrewAI] CrewAI execution error: %s", e)
+        logger.warning("[CrewAI] Falling back to RAG-only mode")
+        return await run_rag_only_diagnosis(request, start_time, rag_cache)
 
-def run_rag_only_diagnosis(request: DiagnoseRequest, start_time: float) -> DiagnoseResponse:
+async def run_rag_only_diagnosis(
+    request: DiagnoseRequest,
+    start_time: float,
+    rag_cache: Optional[RequestCache] = None
+) -> DiagnoseResponse:
     """Run diagnosis using RAG only (fallback mode)."""
+    rag_cache = rag_cache or RequestCache()
     try:
-        rag_result = query_rag(request.query, top_k=10, ata_code=request.ata_code)
+        rag_result = await rag_cache.query(request.query, top_k=10, ata_code=request.ata_code)
     except Exception as e:
-        print(f"[CrewAI] RAG query exception: {e}")
+        logger.warning("[CrewAI] RAG query exception: %s", e)
         raise HTTPException(status_code=503, detail=f"RAG query failed: {e}")
     
     if "error" in rag_result:
@@ -1852,44 +2665,26 @@ def run_rag_only_diagnosis(request: DiagnoseRequest, start_time: float) -> Diagn
     diagnosis_text = clean_markdown_artifacts(raw_diagnosis)
     diagnosis_text = validate_part_numbers(diagnosis_text)
     
-    ata_chapter = extract_ata_chapter(diagnosis_text) or rag_result.get("ata", "")
-    
-    parts_raw = extract_part_numbers(diagnosis_text)
-    affected_parts = [
-        AffectedPart(
-            part_number=p["part_number"],
-            description=p["description"],
-            location=p["location"],
-            action=p["action"]
-        ) for p in parts_raw
-    ]
-    
-    causes_raw = extract_likely_causes(diagnosis_text)
-    likely_causes = [
-        LikelyCause(
-            cause=c["cause"],
-            probability=c["probability"],
-            reasoning=c["reasoning"]
-        ) for c in causes_raw
-    ]
+    diagnosis_lower = diagnosis_text.lower()
+    extracted = extract_all(diagnosis_text, diagnosis_lower)
+    ata_chapter = extracted["ata_chapter"] or rag_result.get("ata", "")
+    
+    parts_raw = extracted["parts"]
+    affected_parts = [AffectedPart(**p) for p in parts_raw]
+    
+    causes_raw = extract_likely_causes(diagnosis_text, diagnosis_lower)
+    likely_causes = [LikelyCause(**c) for c in causes_raw]
     
     tests_raw = extract_recommended_tests(diagnosis_text, ata_chapter)
-    recommended_tests = [
-        RecommendedTest(
-            step=t["step"],
-            description=t["description"],
-            reference=t["reference"],
-            expected_result=t["expected_result"]
-        ) for t in tests_raw
-    ]
-    
-    references = extract_references(diagnosis_text)
+    recommended_tests = [RecommendedTest(**t) for t in tests_raw]
+    
+    references = extracted["references"]
     if not references and rag_result.get("references"):
         references = rag_result["references"][:10]
     
     certainty_result = calculate_certainty_score(
         rag_result, diagnosis_text, request.query, request.ata_code,
-        task_type=request.task_type or "fault_isolation"
+        task_type=request.task_type, diagnosis_lower=diagnosis_lower
     )
     certainty_score = certainty_result["score"]
     certainty_status = "SAFE_TO_PROCEED" if certainty_score >= CERTAINTY_THRESHOLD else "REQUIRE_EXPERT"
@@ -1907,11 +2702,11 @@ def run_rag_only_diagnosis(request: DiagnoseRequest, start_time: float) -> Diagn
     
     processing_time = (time.time() - start_time) * 1000
     
-    print(f"\n[CrewAI] RAG-Only Diagnosis complete")
-    print(f"[CrewAI] Certainty: {certainty_score}% - {certainty_status}")
-    print(f"[CrewAI] Parts found: {len(affected_parts)}")
-    print(f"[CrewAI] References: {len(references)}")
-    print(f"[CrewAI] Processing time: {processing_time:.0f}ms\n")
+    logger.info("[CrewAI] RAG-Only Diagnosis complete")
+    logger.info("[CrewAI] Certainty: %s%% - %s", certainty_score, certainty_status)
+    logger.info("[CrewAI] Parts found: %d", len(affected_parts))
+    logger.info("[CrewAI] References: %d", len(references))
+    logger.info("[CrewAI] Processing time: %.0fms", processing_time)
     
     return DiagnoseResponse(
         query=request.query,
@@ -1938,6 +2733,9 @@ def wait_for_port(port, max_retries=5, delay=3):
     import socket
     for attempt in range(max_retries):
         sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        # Bind the way uvicorn does, so TIME_WAIT sockets left by the previous
+        # process don't count as "in use"; only a live listener does
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         try:
             sock.bind(("0.0.0.0", port))
             sock.close()
@@ -1945,20 +2743,36 @@ def wait_for_port(port, max_retries=5, delay=3):
         except OSError:
             sock.close()
             if attempt < max_retries - 1:
-                print(f"[CrewAI] Port {port} in use, waiting {delay}s (attempt {attempt+1}/{max_retries})...")
+                logger.warning(
+                    "[CrewAI] Port %d in use, waiting %ss (attempt %d/%d)...", port, delay, attempt + 1, max_retries
+                )
                 time.sleep(delay)
     return False
 
 if __name__ == "__main__":
     import uvicorn
-    port = int(os.environ.get("CREW_API_PORT", "9000"))
+    port = settings.port
     
     if not wait_for_port(port):
-        print(f"[CrewAI] ERROR: Port {port} still in use after retries. Exiting.")
+        logger.error("[CrewAI] Port %d still in use after retries. Exiting.", port)
         exit(1)
     
-    print(f"Starting AW139 CrewAI 3-Tier Diagnostic Server on port {port}")
-    print(f"Agents: Investigator -> Validator -> Supervisor")
-    print(f"RAG API endpoint: {RAG_QUERY_ENDPOINT}")
-    print(f"Certainty threshold: {CERTAINTY_THRESHOLD}%")
-    uvicorn.run(app, host="0.0.0.0", port=port, timeout_keep_alive=120, access_log=True)
+    logger.info("Starting AW139 CrewAI 3-Tier Diagnostic Server on port %d", port)
+    logger.info("Agents: Investigator -> Validator -> Supervisor")
+    logger.info("RAG API endpoint: %s", RAG_QUERY_ENDPOINT)
+    logger.info("Certainty threshold: %d%%", CERTAINTY_THRESHOLD)
+    
+    workers = settings.workers
+    logger.info("Workers: %d", workers)
+    
+    # loop/http "auto" pick uvloop and httptools (uvicorn[standard]) when installed
+    uvicorn.run(
+        "crew_server:app" if workers > 1 else app,
+        host="0.0.0.0",
+        port=port,
+        timeout_keep_alive=120,
+        access_log=True,
+        loop="auto",
+        http="auto",
+        workers=workers
+    )
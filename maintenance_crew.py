@@ -16,7 +16,10 @@ import sys
 import time
 from typing import Any, Dict, Optional, List
 
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from crewai import Agent, Crew, Process, Task
 from crewai.tools import BaseTool
 
@@ -32,8 +35,13 @@ REQUEST_TIMEOUT: int = 90
 HEALTH_CHECK_TIMEOUT: int = 10
 MAX_RETRIES: int = 3
 RETRY_BACKOFF_BASE: float = 2.0
+MAX_RETRY_AFTER: float = 30.0
 CERTAINTY_THRESHOLD: int = 95
 
+# Connection pool shared by every RAGClient; agents run in parallel worker threads
+HTTP_POOL_CONNECTIONS: int = 16
+HTTP_POOL_MAXSIZE: int = 32
+
 # =============================================================================
 # LOGGING SETUP
 # =============================================================================
@@ -61,6 +69,24 @@ def log_header(title: str) -> None:
 # RAG API CLIENT
 # =============================================================================
 
+def _build_session() -> requests.Session:
+    """Keep-alive session so RAG calls reuse pooled connections."""
+    # Retries stay in RAGClient.query (custom backoff); the adapter never retries
+    adapter = HTTPAdapter(
+        pool_connections=HTTP_POOL_CONNECTIONS,
+        pool_maxsize=HTTP_POOL_MAXSIZE,
+        max_retries=Retry(total=0)
+    )
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({"Connection": "keep-alive"})
+    return session
+
+
+RAG_SESSION: requests.Session = _build_session()
+
+
 class RAGClient:
     """Client for communicating with the RAG API backend."""
 
@@ -68,42 +94,73 @@ class RAGClient:
         self,
         base_url: str = RAG_API_BASE_URL,
         timeout: int = REQUEST_TIMEOUT,
-        max_retries: int = MAX_RETRIES
+        max_retries: int = MAX_RETRIES,
+        cache: Optional[Dict[Any, Dict[str, Any]]] = None,
+        session: requests.Session = RAG_SESSION
     ) -> None:
         self.base_url = base_url
         self.timeout = timeout
         self.max_retries = max_retries
+        self.cache = cache
+        self.session = session
         self.query_endpoint = f"{base_url}/query"
         self.health_endpoint = f"{base_url}/health"
 
     def check_health(self) -> Dict[str, Any]:
         logger.info("Checking RAG API health...")
         try:
-            response = requests.get(self.health_endpoint, timeout=HEALTH_CHECK_TIMEOUT)
+            response = self.session.get(self.health_endpoint, timeout=HEALTH_CHECK_TIMEOUT)
             response.raise_for_status()
-            data = response.json()
+            data = orjson.loads(response.content)
             logger.info(f"RAG API Status: {data.get('status')} | Docs: {data.get('document_count', 0):,}")
             return data
         except Exception as e:
             logger.error(f"RAG API health check failed: {e}")
             raise ConnectionError(f"RAG API not available: {e}")
 
+    @staticmethod
+    def _retry_delay(response: Optional[requests.Response], default: float) -> float:
+        """Honor the server's Retry-After (in seconds) when present."""
+        if response is None:
+            return default
+        try:
+            return min(max(float(response.headers.get("Retry-After", "")), 0.0), MAX_RETRY_AFTER)
+        except ValueError:
+            return default
+
     def query(self, query_text: str, top_k: int = 10) -> Dict[str, Any]:
+        cache_key = (query_text, top_k)
+        if self.cache is not None and cache_key in self.cache:
+            logger.info(f"RAG Query served from request cache: {query_text[:60]}...")
+            return self.cache[cache_key]
+
         last_error: Optional[Exception] = None
 
         for attempt in range(1, self.max_retries + 1):
             try:
                 logger.info(f"RAG Query (attempt {attempt}/{self.max_retries}): {query_text[:60]}...")
-                response = requests.post(
+                response = self.session.post(
                     self.query_endpoint,
                     json={"query": query_text, "top_k": top_k},
                     timeout=self.timeout
                 )
                 response.raise_for_status()
-                data = response.json()
+                data = orjson.loads(response.content)
                 logger.info(f"RAG Query successful. Documents: {len(data.get('documents', []))}")
+                if self.cache is not None:
+                    self.cache[cache_key] = data
                 return data
 
+            except requests.HTTPError as e:
+                last_error = e
+                status = e.response.status_code if e.response is not None else 0
+                logger.warning(f"Query error on attempt {attempt}: {e}")
+                # 4xx (except 429) is deterministic: fail now instead of sleeping through retries
+                if 400 <= status < 500 and status != 429:
+                    raise RuntimeError(f"RAG query rejected (HTTP {status}): {e}") from e
+                if attempt < self.max_retries:
+                    time.sleep(self._retry_delay(e.response, RETRY_BACKOFF_BASE ** attempt))
+
             except Exception as e:
                 last_error = e
                 logger.warning(f"Query error on attempt {attempt}: {e}")
@@ -121,6 +178,8 @@ class RAGQueryTool(BaseTool):
     """CrewAI tool for querying AW139 RAG documentation system."""
 
     name: str = "RAGQueryTool"
+    # Shared by the tools of one crew so repeated agent queries skip the RAG round trip
+    request_cache: Any = None
     description: str = (
         "Query the AW139 RAG documentation system containing 22,000+ documents. "
         "Use this tool to search for: ATA chapters, AWP procedures, AMM sections, "
@@ -136,7 +195,7 @@ class RAGQueryTool(BaseTool):
         logger.info(f"RAGQueryTool executing: {query[:80]}...")
 
         try:
-            client = RAGClient()
+            client = RAGClient(cache=self.request_cache)
             data = client.query(query, top_k=10)
             return self._format_response(query, data)
         except Exception as e:
@@ -177,7 +236,7 @@ class RAGQueryTool(BaseTool):
 # 3-TIER AGENT SYSTEM
 # =============================================================================
 
-def create_investigator_agent() -> Agent:
+def create_investigator_agent(request_cache: Optional[Dict[Any, Dict[str, Any]]] = None) -> Agent:
     """
     AGENT 1: Senior AW139 Troubleshooting Specialist
     - 25+ years experience in AW139 maintenance
@@ -207,14 +266,14 @@ def create_investigator_agent() -> Agent:
             "technical data. If information is not found, you clearly state 'DATA NOT FOUND IN MANUALS'. "
             "Your investigations are thorough and leave no stone unturned."
         ),
-        tools=[RAGQueryTool()],
+        tools=[RAGQueryTool(request_cache=request_cache)],
         verbose=True,
         allow_delegation=False,
         max_iter=5,
     )
 
 
-def create_validator_agent() -> Agent:
+def create_validator_agent(request_cache: Optional[Dict[Any, Dict[str, Any]]] = None) -> Agent:
     """
     AGENT 2: Documentation Validator and Professional Editor
     - Senior troubleshooting specialist with editorial expertise
@@ -263,7 +322,7 @@ def create_validator_agent() -> Agent:
             "Every part number must be complete, every reference must include the full document ID, "
             "and the text must flow logically from diagnosis to recommendations."
         ),
-        tools=[RAGQueryTool()],
+        tools=[RAGQueryTool(request_cache=request_cache)],
         verbose=True,
         allow_delegation=False,
         max_iter=5,
@@ -534,10 +593,11 @@ ADD your supervisor notes explaining your decision.
 class AW139DiagnosticCrew:
     """Main diagnostic crew with 3-tier hierarchical agents."""
 
-    def __init__(self) -> None:
+    def __init__(self, request_cache: Optional[Dict[Any, Dict[str, Any]]] = None) -> None:
+        self.request_cache = request_cache if request_cache is not None else {}
         self.rag_client = RAGClient()
-        self.investigator = create_investigator_agent()
-        self.validator = create_validator_agent()
+        self.investigator = create_investigator_agent(self.request_cache)
+        self.validator = create_validator_agent(self.request_cache)
         self.supervisor = create_supervisor_agent()
 
     def validate_rag_api(self) -> bool:
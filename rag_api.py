@@ -41,6 +41,9 @@ embeddings_index: List[Dict[str, Any]] = []
 index_loaded: bool = False
 last_reload_time: float = 0.0
 
+# Shared keep-alive session so each OpenAI call reuses a pooled TLS connection
+openai_session = requests.Session()
+
 # ======================================================================
 # FASTAPI APP
 # ======================================================================
@@ -154,7 +157,7 @@ def get_query_embedding(query: str) -> Optional[List[float]]:
     if not OPENAI_API_KEY:
         return None
     try:
-        response = requests.post(
+        response = openai_session.post(
             "https://api.openai.com/v1/embeddings",
             headers={"Authorization": f"Bearer {OPENAI_API_KEY}"},
             json={"input": query, "model": EMBEDDING_MODEL},
@@ -526,7 +529,7 @@ Maintenance Query: {query}
 IMPORTANT: You MUST cite at least one of the DMC codes listed above in your response.
 Extract the EXACT procedure steps from the documentation - do not paraphrase."""
 
-        response = requests.post(
+        response = openai_session.post(
             "https://api.openai.com/v1/chat/completions",
             headers={"Authorization": f"Bearer {OPENAI_API_KEY}"},
             json={
@@ -686,8 +689,10 @@ def keyword_rerank_score(query: str, doc_text: str) -> float:
     
     return boost
 
+# A plain def: FastAPI runs it in its threadpool, so the blocking OpenAI
+# calls and the index scan no longer stall the event loop (and /health)
 @app.post("/query", response_model=QueryResponse)
-async def query_rag(request: QueryRequest):
+def query_rag(request: QueryRequest):
     """Query the RAG system with a maintenance question."""
     start_time = time.time()
 
@@ -809,6 +814,9 @@ def wait_for_port(port, max_retries=5, delay=3):
     import socket
     for attempt in range(max_retries):
         sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        # Bind the way uvicorn does, so TIME_WAIT sockets left by the previous
+        # process don't count as "in use"; only a live listener does
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         try:
             sock.bind(("0.0.0.0", port))
             sock.close()
@@ -829,4 +837,5 @@ if __name__ == "__main__":
         exit(1)
     
     print(f"Starting AW139 RAG API on port {port}")
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    # Keep idle connections open longer than the crew server's client pool expiry
+    uvicorn.run(app, host="0.0.0.0", port=port, timeout_keep_alive=120)